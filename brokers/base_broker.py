@@ -7,13 +7,65 @@ Luke
 Angus
 """
 
+import threading
+import time
 from abc import ABC, abstractmethod
+from typing import Optional
 
+from utils.latency_tracker import latency_tracker
 from utils.logger_config import setup_logger
 from trading_settings import TRADING_LIST, TRADING_CONFIRMATION, TRADING_CASH_MARGIN_CONTROL, TRADING_CASH_THRESHOLD
 from utils.time_tool import is_market_hours, get_current_time
 from utils.wall_api_client import print_status
 
+ORDER_BOOK_SIZE = 500  # recent orders kept in memory, by the brokers with order pushes
+POSITION_CACHE_TTL = 10 * 60  # seconds, a pushed position cache is re-synced with the broker API after this
+
+
+class BrokerCache:
+    """
+    Recent orders and the position cache of a broker kept current by its pushes (order, fill, position events)
+    The pushes come on SDK threads, all the state is guarded by lock, re-entrant so a handler can hold it
+    across several calls
+    """
+
+    def __init__(self, order_book_size: int = ORDER_BOOK_SIZE, positions_ttl: float = POSITION_CACHE_TTL):
+        self.lock = threading.RLock()
+        self.order_book_size = order_book_size
+        self.positions_ttl = positions_ttl
+        self.orders = {}  # order id -> order state, oldest first
+        self.positions = {}  # ticker -> quantity or position data, up to the broker
+        self.positions_synced_at = None  # None when the cache is not valid
+
+    def order_entry(self, order_id: str, **initial) -> dict:
+        """Order book entry of order_id, created from initial if new, the oldest orders are dropped past the size"""
+        with self.lock:
+            order = self.orders.get(order_id)
+            if order is None:
+                order = self.orders[order_id] = dict(initial)
+                while len(self.orders) > self.order_book_size:
+                    self.orders.pop(next(iter(self.orders)))
+            return order
+
+    def get_order(self, order_id) -> Optional[dict]:
+        with self.lock:
+            order = self.orders.get(str(order_id))
+            return dict(order) if order else None
+
+    def seed_positions(self, positions: dict):
+        with self.lock:
+            self.positions = positions
+            self.positions_synced_at = time.time()
+
+    def invalidate_positions(self):
+        with self.lock:
+            self.positions_synced_at = None
+
+    def positions_valid(self) -> bool:
+        with self.lock:
+            return self.positions_synced_at is not None \
+                and time.time() - self.positions_synced_at < self.positions_ttl
+
 
 class BaseBroker(ABC):
     def __init__(self):
@@ -27,6 +79,9 @@ class BaseBroker(ABC):
         self.ret_ok_code = 1
         self.ret_error_code = -1
 
+        # brokers with order / position pushes keep them here
+        self.cache: Optional[BrokerCache] = None
+
     @abstractmethod
     def get_positions(self):
         """
@@ -114,7 +169,24 @@ class BaseBroker(ABC):
         """
         pass
 
-    def broker_make_trade(self, direction: str, called_by: str, stock: str, quantity: int, price: float):
+    def get_order(self, order_id) -> Optional[dict]:
+        """
+        Get the latest pushed state of a recent order
+        :param order_id:
+        :return: order state, None if unknown or the broker has no order pushes
+        """
+        return self.cache.get_order(order_id) if self.cache is not None else None
+
+    def close(self):
+        """
+        Release the broker connections, called once on shutdown
+        Brokers that keep a session or context open should override it
+        """
+        pass
+
+    def broker_make_trade(self, direction: str, called_by: str, stock: str, quantity: int, price: float,
+                          trace: Optional[dict] = None):
+        # trace: optional latency trace of the signal, stamped right before and after the order call
         if stock in TRADING_LIST and TRADING_CONFIRMATION:
             # Bull, buy order
             if direction == "Bull":
@@ -130,7 +202,9 @@ class BaseBroker(ABC):
                 if current_cash >= TRADING_CASH_THRESHOLD and current_cash > quantity * price or not TRADING_CASH_MARGIN_CONTROL:
                     if is_market_hours():
                         # market order
+                        latency_tracker.mark(trace, 'pre_trade')
                         ret_status_code, order_data = self.market_buy(stock, quantity, price)
+                        latency_tracker.mark(trace, 'ordered')
                         if ret_status_code == self.ret_ok_code:
                             data = f"{get_current_time()}: Market Buy: {stock}, {quantity}, {price}, order placed successfully, please check account. by: {called_by}"
                             # print(data)
@@ -148,7 +222,9 @@ class BaseBroker(ABC):
                             self.logger.error(order_data)   # only log error msg, updated 03-09-2025
                     else:
                         # limit order extended hours
+                        latency_tracker.mark(trace, 'pre_trade')
                         ret_status_code, order_data = self.limit_buy(stock, quantity, price)
+                        latency_tracker.mark(trace, 'ordered')
                         if ret_status_code == self.ret_ok_code:
                             data = f"{get_current_time()}: Limit Buy: {stock}, {quantity}, {price}, order placed successfully, please check account, by: {called_by}"
                             # print(data)
@@ -193,7 +269,9 @@ class BaseBroker(ABC):
                 if ok_to_sell:
                     if is_market_hours():
                         # market order
+                        latency_tracker.mark(trace, 'pre_trade')
                         ret_status_code, order_data = self.market_sell(stock, quantity, price)
+                        latency_tracker.mark(trace, 'ordered')
                         if ret_status_code == self.ret_ok_code:
                             data = f"{get_current_time()}: Market Sell: {stock}, {quantity}, {price}, order placed successfully, please check account., by: {called_by}"
                             # print(data)
@@ -209,7 +287,9 @@ class BaseBroker(ABC):
                             self.logger.warning(data)   # only log warning msg, updated 03-09-2025
                     else:
                         # limit order extended hours
+                        latency_tracker.mark(trace, 'pre_trade')
                         ret_status_code, order_data = self.limit_sell(stock, quantity, price)
+                        latency_tracker.mark(trace, 'ordered')
                         if ret_status_code == self.ret_ok_code:
                             data = f"{get_current_time()}: Limit Sell: {stock}, {quantity}, {price}, order placed successfully, please check account., by: {called_by}"
                             # print(data)
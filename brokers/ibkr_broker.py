@@ -9,6 +9,7 @@ Angus
 
 from brokers.base_broker import BaseBroker
 from ib_insync import IB, Stock, MarketOrder, LimitOrder, Trade
+import threading
 import time
 from env._secrete import IBKR_account_number
 
@@ -28,9 +29,12 @@ Step 1: Set up the environment information
 CREDENTIAL = {
     'host': 'localhost',
     'port': 4001,  # IB Gateway or TWS port number, should be 4001 or 7497 in default
-    'client_id': 1,
+    'client_id': 1,  # first client id tried, the next ones are used if it is taken by another process
+    'client_id_range': 10,  # number of client ids to try, from client_id
     'readonly': False
 }
+KEEPALIVE_INTERVAL = 60  # seconds, an idle session is checked with reqCurrentTime before it is used again
+REQUEST_TIMEOUT = 10  # seconds, for the requests that wait on the gateway
 
 '''
 Step 2: Set up the account information
@@ -49,106 +53,224 @@ FILL_OUTSIDE_MARKET_HOURS = TRADING_ALLOW_PRE_POST_MARKET_ORDER  # enable if ord
 class IBKRBroker(BaseBroker):
     def __init__(self):
         super().__init__()
+        # one long-lived session, reconnected on demand, never disconnected between calls
         self.ib = IB()
+        self.ib.RequestTimeout = REQUEST_TIMEOUT
+        self.ib.disconnectedEvent += self._on_disconnected
+        self.lock = threading.RLock()
+        self.connected = False
+        self.client_id = None  # client id of the live session, reused on reconnect
+        self.owner_thread = None  # ib_insync is bound to the event loop of the thread that connected
+        self.last_active = 0.0
         self.connection_attempts = 0
-        self.max_attempts = 3
         self.retry_delay = 5  # seconds
+        self.next_attempt_at = 0.0  # no blocking retry loop, calls fail fast until then
+
+        # account snapshot, kept current by the session events, pre-trade checks read it instead of the gateway
+        self.account_values = {}  # (tag, currency) -> value, for IBKR_ACCOUNT_NUMBER
+        self.positions_by_ticker = {}  # symbol -> Position
+        self.open_trades = {}  # order id -> Trade, until done
+        self.ib.accountValueEvent += self._on_account_value
+        self.ib.positionEvent += self._on_position
+        self.ib.openOrderEvent += self._on_trade
+        self.ib.orderStatusEvent += self._on_trade
 
     def connect(self) -> bool:
-        while self.connection_attempts < self.max_attempts:
+        """Make sure the session is live, usable on this thread, and responsive"""
+        with self.lock:
+            if self.ib.isConnected() and self.owner_thread != threading.get_ident():
+                # the session belongs to another thread's event loop, e.g. the setup check on the main thread
+                self.logger.info("IBKR session moved to the calling thread, reconnecting")
+                self.ib.disconnect()
+            if self.ib.isConnected() and self._keepalive():
+                self.last_active = time.time()
+                return True
+            if time.time() < self.next_attempt_at:
+                return False
+            return self._open_session()
+
+    def _keepalive(self) -> bool:
+        if time.time() - self.last_active < KEEPALIVE_INTERVAL:
+            return True
+        try:
+            self.ib.reqCurrentTime()
+            return True
+        except Exception as e:
+            self.logger.warning(f"IBKR session keepalive failed, reconnecting: {e}")
+            self.ib.disconnect()
+            return False
+
+    def _open_session(self) -> bool:
+        first_id = CREDENTIAL.get('client_id', 1)
+        client_ids = list(range(first_id, first_id + CREDENTIAL.get('client_id_range', 10)))
+        if self.client_id in client_ids:
+            # the id we had is the most likely to be free again
+            client_ids.remove(self.client_id)
+            client_ids.insert(0, self.client_id)
+
+        for client_id in client_ids:
             try:
                 self.ib.connect(
                     host=CREDENTIAL.get('host', 'localhost'),
                     port=CREDENTIAL.get('port', 4001),
-                    clientId=CREDENTIAL.get('client_id', 1),
-                    readonly=CREDENTIAL.get('readonly', False)
+                    clientId=client_id,
+                    readonly=CREDENTIAL.get('readonly', False),
+                    account=IBKR_ACCOUNT_NUMBER
                 )
                 self.connected = True
+                self.client_id = client_id
+                self.owner_thread = threading.get_ident()
+                self.last_active = time.time()
                 self.connection_attempts = 0
-                # self.logger.info("Successfully connected to IBKR")
+                self.next_attempt_at = 0.0
+                self._seed_snapshot()
+                self.logger.info(f"Connected to IBKR with client id {client_id}")
                 return True
-
+            except ConnectionRefusedError as e:
+                # the gateway is down, other client ids won't help
+                self.logger.error(f"IBKR gateway refused the connection: {e}")
+                break
             except Exception as e:
-                self.connection_attempts += 1
-                self.logger.error(
-                    f"Connection attempt {self.connection_attempts} failed: {e}")
-                if self.connection_attempts < self.max_attempts:
-                    time.sleep(self.retry_delay * self.connection_attempts ** 2)  # exponential backoff
+                # usually the client id is used by another process
+                self.logger.warning(f"Connection with client id {client_id} failed: {e}")
+                self.ib.disconnect()
 
         self.connected = False
-        self.logger.error("Failed to connect to IBKR after maximum attempts")
+        self.connection_attempts += 1
+        delay = min(self.retry_delay * 2 ** (self.connection_attempts - 1), 300)
+        self.next_attempt_at = time.time() + delay
+        self.logger.error(f"Failed to connect to IBKR (attempt {self.connection_attempts}), next attempt in {delay}s")
         return False
 
+    def _on_disconnected(self):
+        self.connected = False
+        self.logger.warning("Disconnected from IBKR")
+
+    # Account snapshot, seeded from the session state on connect, then updated by the events
+
+    def _seed_snapshot(self):
+        self.account_values = {}
+        for value in self.ib.accountValues(IBKR_ACCOUNT_NUMBER):
+            self._on_account_value(value)
+        self.positions_by_ticker = {}
+        for position in self.ib.positions(IBKR_ACCOUNT_NUMBER):
+            self._on_position(position)
+        self.open_trades = {}
+        for trade in self.ib.openTrades():
+            self._on_trade(trade)
+
+    def _on_account_value(self, value):
+        if IBKR_ACCOUNT_NUMBER and value.account != IBKR_ACCOUNT_NUMBER:
+            return
+        self.account_values[(value.tag, value.currency)] = value.value
+
+    def _on_position(self, position):
+        if IBKR_ACCOUNT_NUMBER and position.account != IBKR_ACCOUNT_NUMBER or position.contract.secType != 'STK':
+            return
+        if position.position:
+            self.positions_by_ticker[position.contract.symbol] = position
+        else:
+            self.positions_by_ticker.pop(position.contract.symbol, None)
+
+    def _on_trade(self, trade):
+        order_id = trade.order.orderId
+        if trade.isDone():
+            if self.open_trades.pop(order_id, None) is not None:
+                self.logger.info(f"Order {order_id} {trade.contract.symbol} {trade.orderStatus.status}, "
+                                 f"filled {trade.orderStatus.filled} @ {trade.orderStatus.avgFillPrice}")
+        else:
+            self.open_trades[order_id] = trade
+
+    def _refresh_snapshot(self) -> bool:
+        """Connect if needed and apply the pending session events, no request to the gateway"""
+        if not self.connect():
+            return False
+        self.ib.sleep(0)
+        return True
+
+    def _account_value(self, tag, currency='USD'):
+        value = self.account_values.get((tag, currency))
+        return float(value) if value not in (None, '') else None
+
+    def get_open_trades(self):
+        return list(self.open_trades.values())
+
+    def close(self):
+        with self.lock:
+            if self.ib.isConnected():
+                self.ib.disconnect()
+                self.logger.info("Disconnected from IBKR")
+
     def get_account_info(self):
-        self.connect()
-        if not self.ib.isConnected():
+        if not self._refresh_snapshot():
             self.logger.error(f"Trader: Get Account Info failed: not connected")
             # print("Trader: Get Account Info failed: not connected")
             print_status("Trader", "Get Account Info failed: not connected", "ERROR")
             return self.ret_error_code, None
 
         try:
-            account_summary = self.ib.accountSummary(IBKR_ACCOUNT_NUMBER)
-            self.logger.info(f"Retrieved account info: {account_summary}")
-            return self.ret_ok_code, account_summary
+            acct_info = {
+                'cash': self._account_value('CashBalance'),
+                'total_assets': self._account_value('NetLiquidation'),
+                'market_value': self._account_value('GrossPositionValue'),
+                'positions': len(self.positions_by_ticker),
+                'open_orders': len(self.open_trades),
+            }
+            self.logger.info(f"Retrieved account info: {acct_info}")
+            return self.ret_ok_code, acct_info
         except Exception as e:
             self.logger.error(f"Error retrieving account info: {e}")
             return self.ret_ok_code, None
-        finally:
-            self.ib.disconnect()
-            self.logger.info("Disconnected from IBKR")
 
     def get_cash_balance(self):
-        self.connect()
-        if not self.ib.isConnected():
+        if not self._refresh_snapshot():
             self.logger.error(f"Trader: Get Cash Balance failed: not connected")
             # print("Trader: Get Cash Balance failed: not connected")
             print_status("Trader", "Get Cash Balance failed: not connected", "ERROR")
             return self.ret_error_code, None
 
         try:
-            account_values = self.ib.accountValues(IBKR_ACCOUNT_NUMBER)
-            available_funds = next((v.value for v in account_values if v.tag == 'CashBalance' and v.currency == 'USD'), None)
+            available_funds = self._account_value('CashBalance')
             self.logger.info(f"Retrieved cash balance: {available_funds}")
-            return self.ret_ok_code, float(available_funds)
+            if available_funds is None:
+                return self.ret_error_code, None
+            return self.ret_ok_code, available_funds
         except Exception as e:
             self.logger.error(f"Error retrieving cash balance: {e}")
             return self.ret_error_code, None
-        finally:
-            self.ib.disconnect()
 
     def get_cash_balance_number_only(self):
         return self.get_cash_balance()
 
     def get_positions(self):
-        self.connect()
-        if not self.ib.isConnected():
+        if not self._refresh_snapshot():
             self.logger.error(f"Trader: Get Positions failed: not connected")
             # print("Trader: Get Positions failed: not connected")
             print_status("Trader", "Get Positions failed: not connected", "ERROR")
             return self.ret_error_code, None
 
         try:
-            positions = self.ib.positions(IBKR_ACCOUNT_NUMBER)
+            positions = list(self.positions_by_ticker.values())
             self.logger.info(f"Retrieved positions: {positions}")
             return self.ret_ok_code, positions
         except Exception as e:
             self.logger.error(f"Error retrieving positions: {e}")
             return self.ret_error_code, None
-        finally:
-            self.ib.disconnect()
 
     def get_positions_by_ticker(self, ticker):
+        if not self._refresh_snapshot():
+            self.logger.error(f"Trader: Get Positions by Ticker failed: not connected")
+            print_status("Trader", "Get Positions by Ticker failed: not connected", "ERROR")
+            return self.ret_error_code, None
         try:
-            positions = self.get_positions()
-            return self.ret_ok_code, next((p.position for p in positions[1] if p.contract.symbol == ticker), 0.0)
+            position = self.positions_by_ticker.get(ticker)
+            return self.ret_ok_code, position.position if position is not None else 0.0
         except Exception as e:
             self.logger.error(f"Error retrieving positions by ticker: {e}")
             return self.ret_error_code, None
 
     def market_sell(self, stock: str, quantity: int, price: float):
-        self.connect()
-        if not self.ib.isConnected():
+        if not self.connect():
             self.logger.error(f"Trader: Market Sell failed: not connected")
             # print("Trader: Market Sell failed: not connected")
             print_status("Trader", "Market Sell failed: not connected", "ERROR")
@@ -162,12 +284,9 @@ class IBKRBroker(BaseBroker):
         except Exception as e:
             self.logger.error(f"Error placing market sell order: {e}")
             return self.ret_error_code, None
-        finally:
-            self.ib.disconnect()
 
     def market_buy(self, stock: str, quantity: int, price: float):
-        self.connect()
-        if not self.ib.isConnected():
+        if not self.connect():
             self.logger.error(f"Trader: Market Buy failed: not connected")
             # print("Trader: Market Buy failed: not connected")
             print_status("Trader", "Market Buy failed: not connected", "ERROR")
@@ -181,12 +300,9 @@ class IBKRBroker(BaseBroker):
         except Exception as e:
             self.logger.error(f"Error placing market buy order: {e}")
             return self.ret_error_code, None
-        finally:
-            self.ib.disconnect()
 
     def limit_sell(self, stock: str, quantity: int, price: float):
-        self.connect()
-        if not self.ib.isConnected():
+        if not self.connect():
             self.logger.error(f"Trader: Limit Sell failed: not connected")
             # print("Trader: Limit Sell failed: not connected")
             print_status("Trader", "Limit Sell failed: not connected", "ERROR")
@@ -200,12 +316,9 @@ class IBKRBroker(BaseBroker):
         except Exception as e:
             self.logger.error(f"Error placing limit sell order: {e}")
             return self.ret_error_code, None
-        finally:
-            self.ib.disconnect()
 
     def limit_buy(self, stock: str, quantity: int, price: float):
-        self.connect()
-        if not self.ib.isConnected():
+        if not self.connect():
             self.logger.error(f"Trader: Limit Buy failed: not connected")
             # print("Trader: Limit Buy failed: not connected")
             print_status("Trader", "Limit Buy failed: not connected", "ERROR")
@@ -220,8 +333,6 @@ class IBKRBroker(BaseBroker):
         except Exception as e:
             self.logger.error(f"Error placing limit buy order: {e}")
             return self.ret_error_code, None
-        finally:
-            self.ib.disconnect()
 
     def _handle_trade_timeout_market(self, trade: Trade, timeout: int = 30):
         start_time = time.time()
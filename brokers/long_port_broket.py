@@ -10,9 +10,11 @@ Angus
 long_port_broker.py
 https://github.com/longportapp/openapi-sdk/tree/main-v2
 """
-from brokers.base_broker import BaseBroker
+from brokers.base_broker import BaseBroker, BrokerCache
 from decimal import Decimal
-from longport.openapi import TradeContext, Config, OrderType, OrderSide, TimeInForceType, OutsideRTH
+import threading
+import time
+from longport.openapi import TradeContext, Config, OrderType, OrderSide, TimeInForceType, OutsideRTH, TopicType
 
 from env._secrete import LongPort_app_key, LongPort_app_secret, LongPort_access_token
 from utils.wall_api_client import print_status
@@ -22,6 +24,18 @@ import nest_asyncio
 nest_asyncio.apply()
 
 
+def _field(event, name, default=None):
+    """Field of an SDK push event, object or dict"""
+    if isinstance(event, dict):
+        return event.get(name, default)
+    return getattr(event, name, default)
+
+
+def _ticker_of(symbol) -> str:
+    symbol = str(symbol or '')
+    return symbol[:-3] if symbol.upper().endswith('.US') else symbol
+
+
 class LongPortBroker(BaseBroker):
 
     def __init__(self):
@@ -29,29 +43,81 @@ class LongPortBroker(BaseBroker):
         self.config = Config(app_key=LongPort_app_key,
                              app_secret=LongPort_app_secret,
                              access_token=LongPort_access_token)
+        # one TradeContext for the lifetime of the process, created on first use
         self.ctx = None
+        self.ctx_lock = threading.Lock()
 
         self.currency = "USD"
         # self.is_connected = False
 
+        # order and position state, kept current by the order changed pushes
+        # positions: ticker -> quantity, seeded by stock_positions, then updated by the fills
+        self.cache = BrokerCache()
+
     def connect(self):
-        try:
-            self.ctx = TradeContext(self.config)
-            if self.ctx:
+        if self.ctx is not None:
+            return True
+        with self.ctx_lock:
+            if self.ctx is not None:
+                return True
+            try:
+                ctx = TradeContext(self.config)
+                if not ctx:
+                    self.logger.error("Failed to connect to LongPort")
+                    print_status("LongPort Trader", "Connect to LongPort failed, ctx empty, error", "ERROR")
+                    return False
+                ctx.set_on_order_changed(self.on_order_changed)
+                ctx.subscribe([TopicType.Private])
+                self.ctx = ctx
                 self.logger.info("Connected to LongPort")
                 print_status("LongPort Trader", "Connected to LongPort", "INFO")
                 return True
-            else:
-                self.logger.error("Failed to connect to LongPort")
-                print_status("LongPort Trader", "Connect to LongPort failed, ctx empty, error", "ERROR")
+            except Exception as e:
+                self.logger.error(f"Failed to connect to LongPort: {e}")
+                print_status("LongPort Trader", f"Connect to LongPort failed, {e}", "ERROR")
                 return False
-        except Exception as e:
-            self.logger.error(f"Failed to connect to LongPort: {e}")
-            print_status("LongPort Trader", f"Connect to LongPort failed, {e}", "ERROR")
-            return False
 
     def disconnect(self):
-        self.ctx = None
+        with self.ctx_lock:
+            if self.ctx is None:
+                return
+            try:
+                self.ctx.unsubscribe([TopicType.Private])
+            except Exception as e:
+                self.logger.warning(f"Failed to unsubscribe the LongPort order pushes: {e}")
+            self.ctx = None
+            self.cache.invalidate_positions()
+            self.logger.info("Disconnected from LongPort")
+
+    def close(self):
+        self.disconnect()
+
+    # Order and position state, updated by the order changed pushes, on the SDK thread
+
+    def on_order_changed(self, event):
+        order_id = str(_field(event, 'order_id'))
+        ticker = _ticker_of(_field(event, 'symbol'))
+        status = _field(event, 'status')
+        executed = float(_field(event, 'executed_quantity', 0) or 0)
+        with self.cache.lock:
+            order = self.cache.order_entry(order_id, order_id=order_id, executed_quantity=0.0)
+            # executed_quantity is cumulative per order, the position moves by the difference
+            delta = executed - order['executed_quantity']
+            side = _field(event, 'side')
+            order.update({
+                'symbol': _field(event, 'symbol'),
+                'side': side,
+                'status': status,
+                'executed_quantity': executed,
+                'executed_price': _field(event, 'executed_price'),
+                'submitted_quantity': _field(event, 'submitted_quantity'),
+                'updated_at': time.time(),
+            })
+            if delta and self.cache.positions_synced_at is not None:
+                sign = 1 if side == OrderSide.Buy else -1
+                self.cache.positions[ticker] = self.cache.positions.get(ticker, 0.0) + sign * delta
+        self.logger.info(f"Order {order_id} {ticker} {side} {status}, executed {executed} "
+                         f"@ {_field(event, 'executed_price')}")
 
     def get_cash_balance(self):
         if self.connect():
@@ -66,23 +132,19 @@ class LongPortBroker(BaseBroker):
                             # withdraw_cash = cash_info.get("withdraw_cash")
                             # frozen_cash = cash_info.get("frozen_cash")
                             # settling_cash = cash_info.get("settling_cash")
-                            self.disconnect()
                             return self.ret_ok_code, available_cash
                     msg = f"Failed to get cash balance, NO USD FOUND: {resp}"
                     self.logger.error(msg)
                     print_status("LongPort Trader", msg, "ERROR")
-                    self.disconnect()
                     return self.ret_error_code, 0.0
                 meg = f"Failed to get cash balance, cash list is empty: {resp}"
                 self.logger.error(meg)
                 print_status("LongPort Trader", meg, "ERROR")
-                self.disconnect()
                 return self.ret_error_code, 0.0
             else:
                 msg = f"Failed to get cash balance: {resp}"
                 self.logger.error(msg)
                 print_status("LongPort Trader", msg, "ERROR")
-                self.disconnect()
                 return self.ret_error_code, 0.0
 
     def get_cash_balance_number_only(self):
@@ -92,13 +154,11 @@ class LongPortBroker(BaseBroker):
         if self.connect():
             resp = self.ctx.account_balance()
             if resp and resp.get("code") == 0:
-                self.disconnect()
                 return self.ret_ok_code, resp["data"]
             else:
                 msg = f"Failed to get account info: {resp}"
                 self.logger.error(msg)
                 print_status("LongPort Trader", msg, "ERROR")
-                self.disconnect()
                 return self.ret_error_code, None
 
     def get_positions(self):
@@ -106,45 +166,31 @@ class LongPortBroker(BaseBroker):
             resp = self.ctx.stock_positions()
             if resp and resp.get("code") == 0:
                 stock_list = resp.get("data", {}).get("list", [])
-                stock_info_list = stock_list[0].get("stock_info", [])
-                self.disconnect()
+                stock_info_list = stock_list[0].get("stock_info", []) if stock_list else []
+                self.cache.seed_positions({_ticker_of(stock.get("symbol")): float(stock.get("quantity") or 0)
+                                           for stock in stock_info_list})
                 return self.ret_ok_code, stock_info_list
             else:
                 msg = f"Failed to get positions: {resp}"
                 self.logger.error(msg)
                 print_status("LongPort Trader", msg, "ERROR")
-                self.disconnect()
                 return self.ret_error_code, msg
 
     def get_positions_by_ticker(self, ticker: str):
+        """From the pushed position cache, stock_positions is only called to (re-)seed it"""
         if self.connect():
-            resp = self.ctx.stock_positions()
-            if resp and resp.get("code") == 0:
-                stock_list = resp.get("data", {}).get("list", [])
-                stock_info_list = stock_list[0].get("stock_info", [])
-                if not stock_list:
-                    msg = f"Failed to get positions by ticker, stock list is empty: {resp}"
-                    self.logger.error(msg)
-                    print_status("LongPort Trader", msg, "ERROR")
-                    self.disconnect()
-                    return self.ret_ok_code, 0.0
-
-                for stock in stock_info_list:
-                    if stock.get("symbol") == ticker:
-                        self.disconnect()
-                        return self.ret_ok_code, stock.get("quantity")
-
-                msg = f"Failed to get positions by ticker, ticker not found: {resp}"
+            if not self.cache.positions_valid():
+                ret, data = self.get_positions()
+                if ret != self.ret_ok_code:
+                    return ret, data
+            with self.cache.lock:
+                quantity = self.cache.positions.get(_ticker_of(ticker.upper()))
+            if quantity is None:
+                msg = f"Failed to get positions by ticker, ticker not found: {ticker}"
                 self.logger.error(msg)
                 print_status("LongPort Trader", msg, "WARNING")
-                self.disconnect()
                 return self.ret_ok_code, 0.0
-            else:
-                msg = f"Failed to get positions by ticker: {resp}"
-                self.logger.error(msg)
-                print_status("LongPort Trader", msg, "ERROR")
-                self.disconnect()
-                return self.ret_error_code, msg
+            return self.ret_ok_code, quantity
 
     def market_sell(self, stock: str, quantity: int, price: float):
         if self.connect():
@@ -158,19 +204,16 @@ class LongPortBroker(BaseBroker):
 
             if resp and resp.get("code") == 0:
                 if resp["message"] == "success":
-                    self.disconnect()
                     return self.ret_ok_code, resp["data"]
                 else:
                     msg = f"Failed to market sell: {resp}"
                     self.logger.error(msg)
                     print_status("LongPort Trader", msg, "ERROR")
-                    self.disconnect()
                     return self.ret_error_code, msg
             else:
                 msg = f"Failed to market sell: {resp}"
                 self.logger.error(msg)
                 print_status("LongPort Trader", msg, "ERROR")
-                self.disconnect()
                 return self.ret_error_code, msg
 
     def market_buy(self, stock: str, quantity: int, price: float):
@@ -185,19 +228,16 @@ class LongPortBroker(BaseBroker):
 
             if resp and resp.get("code") == 0:
                 if resp["message"] == "success":
-                    self.disconnect()
                     return self.ret_ok_code, resp["data"]
                 else:
                     msg = f"Failed to market buy: {resp}"
                     self.logger.error(msg)
                     print_status("LongPort Trader", msg, "ERROR")
-                    self.disconnect()
                     return self.ret_error_code, msg
             else:
                 msg = f"Failed to market buy: {resp}"
                 self.logger.error(msg)
                 print_status("LongPort Trader", msg, "ERROR")
-                self.disconnect()
                 return self.ret_error_code, msg
 
     def limit_sell(self, stock: str, quantity: int, price: float):
@@ -214,19 +254,16 @@ class LongPortBroker(BaseBroker):
 
             if resp and resp.get("code") == 0:
                 if resp["message"] == "success":
-                    self.disconnect()
                     return self.ret_ok_code, resp["data"]
                 else:
                     msg = f"Failed to limit sell: {resp}"
                     self.logger.error(msg)
                     print_status("LongPort Trader", msg, "ERROR")
-                    self.disconnect()
                     return self.ret_error_code, msg
             else:
                 msg = f"Failed to limit sell: {resp}"
                 self.logger.error(msg)
                 print_status("LongPort Trader", msg, "ERROR")
-                self.disconnect()
                 return self.ret_error_code, msg
 
     def limit_buy(self, stock: str, quantity: int, price: float):
@@ -243,18 +280,15 @@ class LongPortBroker(BaseBroker):
 
             if resp and resp.get("code") == 0:
                 if resp["message"] == "success":
-                    self.disconnect()
                     return self.ret_ok_code, resp["data"]
                 else:
                     msg = f"Failed to limit buy: {resp}"
                     self.logger.error(msg)
                     print_status("LongPort Trader", msg, "ERROR")
-                    self.disconnect()
                     return self.ret_error_code, msg
             else:
                 msg = f"Failed to limit buy: {resp}"
                 self.logger.error(msg)
                 print_status("LongPort Trader", msg, "ERROR")
-                self.disconnect()
                 return self.ret_error_code, msg
 
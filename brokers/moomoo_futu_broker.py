@@ -23,9 +23,12 @@ Angus
 # 官方文档，中文:
 # https://openapi.moomoo.com/moomoo-api-doc/intro/intro.html
 
+import threading
+import time
+
 from moomoo import *
 
-from brokers.base_broker import BaseBroker
+from brokers.base_broker import BaseBroker, BrokerCache
 from env._secrete import MooMoo_Futu_PWD, MooMoo_Futu_SecurityFirm
 from trading_settings import TRADING_BROKER, TRADING_ALLOW_PRE_POST_MARKET_ORDER
 from utils.wall_api_client import print_status
@@ -49,6 +52,7 @@ TRADING_ENVIRONMENT = TrdEnv.REAL  # set up trading environment, real, or simula
 Step 2: Set up the account information
 '''
 TRADING_PWD = MooMoo_Futu_PWD  # set up the trading password in the env/_secrete.py file
+UNLOCK_TTL = 30 * 60  # seconds, the trade is unlocked again after this, or right after OpenD reconnects
 
 '''
 Step 3: Set up the trading information
@@ -65,11 +69,48 @@ TRADING_MARKET = TrdMarket.US  # set up the trading market, US market, HK for Ho
 """ ⏫ project setup ⏫ """
 
 
+# Push handlers, called on the moomoo SDK thread:
+class MooMooOrderHandler(TradeOrderHandlerBase):
+    def __init__(self, broker):
+        super().__init__()
+        self.broker = broker
+
+    def on_recv_rsp(self, rsp_pb):
+        ret, data = super().on_recv_rsp(rsp_pb)
+        if ret == RET_OK:
+            for order in data.to_dict(orient='records'):
+                self.broker.on_order_update(order)
+        return ret, data
+
+
+class MooMooDealHandler(TradeDealHandlerBase):
+    def __init__(self, broker):
+        super().__init__()
+        self.broker = broker
+
+    def on_recv_rsp(self, rsp_pb):
+        ret, data = super().on_recv_rsp(rsp_pb)
+        if ret == RET_OK:
+            for deal in data.to_dict(orient='records'):
+                self.broker.on_deal_update(deal)
+        return ret, data
+
+
 # Trader class:
 class MooMooFutuBroker(BaseBroker):
     def __init__(self):
         super().__init__()
+        # one long-lived trade context, shared by all calls, OpenD reconnects it by itself
         self.trade_context = None
+        self.context_lock = threading.RLock()  # orders may come from several dispatcher threads
+        self.unlocked_at = None  # time of the last successful unlock_trade
+        self.unlocked_conn = None  # connection the unlock was done on, a reconnect needs a new unlock
+
+        # order book (id -> status, fills and timing) and position cache (ticker -> qty, seeded by
+        # position_list_query, then updated by the deals), fed by the order and deal pushes of the trade context
+        self.cache = BrokerCache()
+        self.positions_conn = None  # connection the cache was seeded on, pushes may be lost on a reconnect
+        self.seen_deals = set()
 
         # set up the security firm based on your broker account registration
         if MooMoo_Futu_SecurityFirm == 'FUTUINC':
@@ -82,188 +123,288 @@ class MooMooFutuBroker(BaseBroker):
             self.Broker_SecurityFirm = SecurityFirm.FUTUAU  # for Australia account, use 'FUTUAU'
 
     def init_context(self):
-        try:
-            # if OpenD not running, it will loop to connect until OpenD is running.
-            self.trade_context = OpenSecTradeContext(filter_trdmarket=TRADING_MARKET, host=MOOMOOOPEND_ADDRESS,
-                                                     port=MOOMOOOPEND_PORT, security_firm=self.Broker_SecurityFirm)
-            self.logger.info('MooMoo/Futu Trader: Init Context success!')
-            return True
-        except Exception as e:
-            self.logger.error(f'MooMoo/Futu Trader: Init Context failed: {e}')
-            self.logger.error('MooMoo/Futu Trader: Please check the OpenD host IP and port number!')
-            print_status("MooMoo/Futu Trader", "Init Context failed, please check the OpenD host IP and port number!",
-                         "ERROR")
-            return False
+        """Open the trade context once, and again only if it was closed"""
+        with self.context_lock:
+            if self.trade_context is not None and self.trade_context.status != ContextStatus.CLOSED:
+                return True
+            try:
+                # if OpenD not running, it will loop to connect until OpenD is running.
+                self.trade_context = OpenSecTradeContext(filter_trdmarket=TRADING_MARKET, host=MOOMOOOPEND_ADDRESS,
+                                                         port=MOOMOOOPEND_PORT, security_firm=self.Broker_SecurityFirm)
+                self.unlocked_at = None
+                self.trade_context.set_handler(MooMooOrderHandler(self))
+                self.trade_context.set_handler(MooMooDealHandler(self))
+                self.cache.invalidate_positions()
+                self.logger.info('MooMoo/Futu Trader: Init Context success!')
+                return True
+            except Exception as e:
+                self.trade_context = None
+                self.logger.error(f'MooMoo/Futu Trader: Init Context failed: {e}')
+                self.logger.error('MooMoo/Futu Trader: Please check the OpenD host IP and port number!')
+                print_status("MooMoo/Futu Trader",
+                             "Init Context failed, please check the OpenD host IP and port number!", "ERROR")
+                return False
 
     def close_context(self):
-        self.trade_context.close()
-        self.logger.info('MooMoo/Futu Trader: Close Context success!')
+        with self.context_lock:
+            if self.trade_context is None:
+                return
+            self.trade_context.close()
+            self.trade_context = None
+            self.unlocked_at = None
+            self.logger.info('MooMoo/Futu Trader: Close Context success!')
+
+    def close(self):
+        self.close_context()
 
     def _unlock_trade(self):
-        if TRADING_ENVIRONMENT == TrdEnv.REAL:
-            ret, data = self.trade_context.unlock_trade(TRADING_PWD)
-            if ret != RET_OK:
-                print_status("MooMoo/Futu Trader", f"Unlock Trade failed, {data}", "ERROR")
-                return False
-            print_status("MooMoo/Futu Trader", "Unlock Trade success", "SUCCESS")
+        if TRADING_ENVIRONMENT != TrdEnv.REAL:
+            return True
+        conn = self.trade_context.conn_str()
+        if self.unlocked_at is not None and self.unlocked_conn == conn \
+                and time.time() - self.unlocked_at < UNLOCK_TTL:
+            return True
+        ret, data = self.trade_context.unlock_trade(TRADING_PWD)
+        if ret != RET_OK:
+            self.unlocked_at = None
+            print_status("MooMoo/Futu Trader", f"Unlock Trade failed, {data}", "ERROR")
+            return False
+        self.unlocked_at = time.time()
+        self.unlocked_conn = conn
+        print_status("MooMoo/Futu Trader", "Unlock Trade success", "SUCCESS")
         return True
 
-    def market_sell(self, stock, quantity, price):
-        self.init_context()
-        if self._unlock_trade():
-            code = f'US.{stock}'
-            ret, data = self.trade_context.place_order(price=price, qty=quantity, code=code, trd_side=TrdSide.SELL,
-                                                       order_type=OrderType.MARKET, trd_env=TRADING_ENVIRONMENT)
-            if ret != RET_OK:
-                print_status("MooMoo/Futu Trader", "Market Sell failed", "ERROR")
-                self.logger.warning(f'Trader: Market Sell failed: {data}')
-                self.close_context()
+    def _ready(self):
+        """Context open and trade unlocked, call with context_lock held"""
+        return self.init_context() and self._unlock_trade()
+
+    def _trade_call(self, request, is_order=False):
+        """
+        Run request() on the persistent context, ret and data as returned by the moomoo API, (None, None) if
+        the context can't be opened or unlocked. A failure caused by a lost unlock is retried once after a new
+        unlock, a lost connection too, except for orders, which may have reached OpenD before the drop
+        """
+        with self.context_lock:
+            if not self._ready():
+                return None, None
+            ret, data = request()
+            if ret == RET_OK or not self._session_lost(data, is_order):
                 return ret, data
-            print_status("MooMoo/Futu Trader", "Market Sell success", "SUCCESS")
-            self.logger.info('Trader: Market Sell success!')
-            self.close_context()
-            return self.ret_ok_code, data
-        else:
+            self.logger.warning(f'MooMoo/Futu Trader: session lost ({data}), unlocking again')
+            self.unlocked_at = None
+            if not self._ready():
+                return None, None
+            return request()
+
+    def _session_lost(self, data, is_order=False):
+        msg = str(data).lower()
+        if 'unlock' in msg or '解锁' in msg:
+            return True
+        return not is_order and self.trade_context.status != ContextStatus.READY
+
+    def market_sell(self, stock, quantity, price):
+        code = f'US.{stock}'
+        ret, data = self._trade_call(lambda: self.trade_context.place_order(
+            price=price, qty=quantity, code=code, trd_side=TrdSide.SELL,
+            order_type=OrderType.MARKET, trd_env=TRADING_ENVIRONMENT), is_order=True)
+        if ret is None:
             data = 'Trader: Market Sell failed: unlock trade failed'
             print_status("MooMoo/Futu Trader", "Market Sell failed: unlock trade failed", "ERROR")
             self.logger.warning(data)
-            self.close_context()
             return self.ret_error_code, data
+        if ret != RET_OK:
+            print_status("MooMoo/Futu Trader", "Market Sell failed", "ERROR")
+            self.logger.warning(f'Trader: Market Sell failed: {data}')
+            return ret, data
+        print_status("MooMoo/Futu Trader", "Market Sell success", "SUCCESS")
+        self.logger.info('Trader: Market Sell success!')
+        self._track_order(data)
+        return self.ret_ok_code, data
 
     def market_buy(self, stock, quantity, price):
-        self.init_context()
-        if self._unlock_trade():
-            code = f'US.{stock}'
-            ret, data = self.trade_context.place_order(price=price, qty=quantity, code=code, trd_side=TrdSide.BUY,
-                                                       order_type=OrderType.MARKET, trd_env=TRADING_ENVIRONMENT)
-            if ret != RET_OK:
-                print_status("MooMoo/Futu Trader", "Market Buy failed", "ERROR")
-                self.logger.warning(f'Trader: Market Buy failed: {data}')
-                self.close_context()
-                return self.ret_error_code, data
-            print_status("MooMoo/Futu Trader", "Market Buy success", "SUCCESS")
-            self.logger.info('Trader: Market Buy success!')
-            self.close_context()
-            return self.ret_ok_code, data
-        else:
+        code = f'US.{stock}'
+        ret, data = self._trade_call(lambda: self.trade_context.place_order(
+            price=price, qty=quantity, code=code, trd_side=TrdSide.BUY,
+            order_type=OrderType.MARKET, trd_env=TRADING_ENVIRONMENT), is_order=True)
+        if ret is None:
             data = 'Trader: Market Buy failed: unlock trade failed'
             print_status("MooMoo/Futu Trader", "Market Buy failed: unlock trade failed", "ERROR")
             self.logger.warning(data)
-            self.close_context()
             return self.ret_error_code, data
+        if ret != RET_OK:
+            print_status("MooMoo/Futu Trader", "Market Buy failed", "ERROR")
+            self.logger.warning(f'Trader: Market Buy failed: {data}')
+            return self.ret_error_code, data
+        print_status("MooMoo/Futu Trader", "Market Buy success", "SUCCESS")
+        self.logger.info('Trader: Market Buy success!')
+        self._track_order(data)
+        return self.ret_ok_code, data
 
     def limit_sell(self, stock, quantity, price):
-        self.init_context()
-        if self._unlock_trade():
-            code = f'US.{stock}'
-            ret, data = self.trade_context.place_order(price=price, qty=quantity, code=code, trd_side=TrdSide.SELL,
-                                                       order_type=OrderType.NORMAL, trd_env=TRADING_ENVIRONMENT,
-                                                       fill_outside_rth=FILL_OUTSIDE_MARKET_HOURS)
-            if ret != RET_OK:
-                print_status("MooMoo/Futu Trader", "Limit Sell failed", "ERROR")
-                self.logger.warning(f'Trader: Limit Sell failed: {data}')
-                self.close_context()
-                return self.ret_error_code, data
-            print_status("MooMoo/Futu Trader", "Limit Sell success", "SUCCESS")
-            self.logger.info('Trader: Limit Sell success!')
-            self.close_context()
-            return self.ret_ok_code, data
-        else:
+        code = f'US.{stock}'
+        ret, data = self._trade_call(lambda: self.trade_context.place_order(
+            price=price, qty=quantity, code=code, trd_side=TrdSide.SELL,
+            order_type=OrderType.NORMAL, trd_env=TRADING_ENVIRONMENT,
+            fill_outside_rth=FILL_OUTSIDE_MARKET_HOURS), is_order=True)
+        if ret is None:
             data = 'Trader: Limit Sell failed: unlock trade failed'
             print_status("MooMoo/Futu Trader", "Limit Sell failed: unlock trade failed", "ERROR")
             self.logger.warning(data)
-            self.close_context()
             return self.ret_error_code, data
+        if ret != RET_OK:
+            print_status("MooMoo/Futu Trader", "Limit Sell failed", "ERROR")
+            self.logger.warning(f'Trader: Limit Sell failed: {data}')
+            return self.ret_error_code, data
+        print_status("MooMoo/Futu Trader", "Limit Sell success", "SUCCESS")
+        self.logger.info('Trader: Limit Sell success!')
+        self._track_order(data)
+        return self.ret_ok_code, data
 
     def limit_buy(self, stock, quantity, price):
-        self.init_context()
-        if self._unlock_trade():
-            code = f'US.{stock}'
-            ret, data = self.trade_context.place_order(price=price, qty=quantity, code=code, trd_side=TrdSide.BUY,
-                                                       order_type=OrderType.NORMAL, trd_env=TRADING_ENVIRONMENT,
-                                                       fill_outside_rth=FILL_OUTSIDE_MARKET_HOURS)
-            if ret != RET_OK:
-                print_status("MooMoo/Futu Trader", "Limit Buy failed", "ERROR")
-                self.logger.warning(f'Trader: Limit Buy failed: {data}')
-                self.close_context()
-                return self.ret_error_code, data
-            print_status("MooMoo/Futu Trader", "Limit Buy success", "SUCCESS")
-            self.logger.info('Trader: Limit Buy success!')
-            self.close_context()
-            return self.ret_ok_code, data
-        else:
+        code = f'US.{stock}'
+        ret, data = self._trade_call(lambda: self.trade_context.place_order(
+            price=price, qty=quantity, code=code, trd_side=TrdSide.BUY,
+            order_type=OrderType.NORMAL, trd_env=TRADING_ENVIRONMENT,
+            fill_outside_rth=FILL_OUTSIDE_MARKET_HOURS), is_order=True)
+        if ret is None:
             data = 'Trader: Limit Buy failed: unlock trade failed'
             print_status("MooMoo/Futu Trader", "Limit Buy failed: unlock trade failed", "ERROR")
             self.logger.warning(data)
-            self.close_context()
             return self.ret_error_code, data
+        if ret != RET_OK:
+            print_status("MooMoo/Futu Trader", "Limit Buy failed", "ERROR")
+            self.logger.warning(f'Trader: Limit Buy failed: {data}')
+            return self.ret_error_code, data
+        print_status("MooMoo/Futu Trader", "Limit Buy success", "SUCCESS")
+        self.logger.info('Trader: Limit Buy success!')
+        self._track_order(data)
+        return self.ret_ok_code, data
 
     def get_account_info(self):
-        self.init_context()
-        if self._unlock_trade():
-            # https://openapi.moomoo.com/moomoo-api-doc/en/trade/get-funds.html
-            # Default, currency=Currency.HKD, change to USD
-            # updated 01-07-2025
-            ret, data = self.trade_context.accinfo_query(currency=Currency.USD)
-            if ret != RET_OK:
-                print_status("MooMoo/Futu Trader", "Get Account Info failed", "ERROR")
-                self.logger.warning(f'Trader: Get Account Info failed: {data}')
-                self.close_context()
-                return self.ret_error_code, data
-
-            acct_info = {
-                # https://openapi.moomoo.com/moomoo-api-doc/en/trade/get-funds.html
-                # Obsolete. Please use 'us_cash' or other fields to get the cash of each currency.
-                # updated 01-07-2025
-                'cash': round(data["us_cash"][0], 2),
-                'total_assets': round(data["total_assets"][0], 2),
-                'market_value': round(data["market_val"][0], 2),
-            }
-            self.close_context()
-            self.logger.info('Trader: Get Account Info success!')
-            return self.ret_ok_code, acct_info
-        else:
+        # https://openapi.moomoo.com/moomoo-api-doc/en/trade/get-funds.html
+        # Default, currency=Currency.HKD, change to USD
+        # updated 01-07-2025
+        ret, data = self._trade_call(lambda: self.trade_context.accinfo_query(currency=Currency.USD))
+        if ret is None:
             data = 'Trader: Get Account Info failed: unlock trade failed'
             print_status("MooMoo/Futu Trader", "Get Account Info failed: unlock trade failed", "ERROR")
             self.logger.warning(data)
-            self.close_context()
+            return self.ret_error_code, data
+        if ret != RET_OK:
+            print_status("MooMoo/Futu Trader", "Get Account Info failed", "ERROR")
+            self.logger.warning(f'Trader: Get Account Info failed: {data}')
             return self.ret_error_code, data
 
+        acct_info = {
+            # https://openapi.moomoo.com/moomoo-api-doc/en/trade/get-funds.html
+            # Obsolete. Please use 'us_cash' or other fields to get the cash of each currency.
+            # updated 01-07-2025
+            'cash': round(data["us_cash"][0], 2),
+            'total_assets': round(data["total_assets"][0], 2),
+            'market_value': round(data["market_val"][0], 2),
+        }
+        self.logger.info('Trader: Get Account Info success!')
+        return self.ret_ok_code, acct_info
+
     def get_positions(self):
-        self.init_context()
-        if self._unlock_trade():
-            ret, data = self.trade_context.position_list_query()
-            if ret != RET_OK:
-                print_status("MooMoo/Futu Trader", "Get Positions failed", "ERROR")
-                self.logger.warning(f'Trader: Get Positions failed: {data}')
-                self.close_context()
-                return self.ret_error_code, data
-            # refactor the data
-            data['code'] = data['code'].str[3:]
-            data_dict = data.set_index('code').to_dict(orient='index')
-            self.close_context()
-            self.logger.info('Trader: Get Positions success!')
-            return self.ret_ok_code, data_dict
-        else:
+        ret, data = self._trade_call(lambda: self.trade_context.position_list_query())
+        if ret is None:
             data = 'Trader: Get Positions failed: unlock trade failed'
             print_status("MooMoo/Futu Trader", "Get Positions failed: unlock trade failed", "ERROR")
             self.logger.warning(data)
-            self.close_context()
             return self.ret_error_code, data
+        if ret != RET_OK:
+            print_status("MooMoo/Futu Trader", "Get Positions failed", "ERROR")
+            self.logger.warning(f'Trader: Get Positions failed: {data}')
+            return self.ret_error_code, data
+        # refactor the data
+        data['code'] = data['code'].str[3:]
+        data_dict = data.set_index('code').to_dict(orient='index')
+        with self.cache.lock:
+            self.cache.seed_positions({ticker: position['qty'] for ticker, position in data_dict.items()})
+            self.seen_deals.clear()  # earlier deals are in the queried positions
+            self.positions_conn = self.trade_context.conn_str() if self.trade_context else None
+        self.logger.info('Trader: Get Positions success!')
+        return self.ret_ok_code, data_dict
 
     def get_positions_by_ticker(self, ticker):
-        position_ret, position_data = self.get_positions()
-        if position_ret != self.ret_ok_code:
-            # get current position quantity
+        # served from the pushed position cache, position_list_query only to (re-)seed it
+        if not self._positions_valid():
+            position_ret, position_data = self.get_positions()
+            if position_ret != self.ret_ok_code:
+                # get current position quantity
+                print_status("MooMoo/Futu Trader", "Get Positions by Ticker failed", "ERROR")
+                return self.ret_error_code, position_data
+        with self.cache.lock:
+            qty = self.cache.positions.get(ticker)
+        if qty is None:
             print_status("MooMoo/Futu Trader", "Get Positions by Ticker failed", "ERROR")
-            return self.ret_error_code, position_data
-        try:
-            qty = position_data[ticker]["qty"]
-            return self.ret_ok_code, qty
-        except KeyError as e:
-            print_status("MooMoo/Futu Trader", "Get Positions by Ticker failed", "ERROR")
-            self.logger.warning(f"Trader: Get Positions by Ticker failed: {e}")
+            self.logger.warning(f"Trader: Get Positions by Ticker failed: {ticker!r}")
             return self.ret_error_code, 0
+        return self.ret_ok_code, qty
+
+    # Order book and position cache, updated by the trade context pushes
+
+    def _positions_valid(self):
+        with self.cache.lock:
+            if not self.cache.positions_valid():
+                return False
+            conn = self.positions_conn
+        # pushes sent while the connection was down are lost, re-seed after a reconnect
+        return self.trade_context is not None and self.trade_context.conn_str() == conn
+
+    def _track_order(self, data):
+        """Remember a placed order, its status and fills then come from the pushes"""
+        try:
+            order_id = str(data['order_id'][0])
+        except (KeyError, IndexError, TypeError):
+            return
+        with self.cache.lock:
+            order = self.cache.order_entry(order_id, order_id=order_id)
+            order['placed_at'] = time.time()
+            # the fill push can arrive before place_order returns
+            if 'filled_at' in order:
+                order['fill_latency'] = round(max(0.0, order['filled_at'] - order['placed_at']), 3)
+
+    def on_order_update(self, order):
+        order_id = str(order.get('order_id'))
+        status = order.get('order_status')
+        with self.cache.lock:
+            tracked = self.cache.order_entry(order_id, order_id=order_id)
+            tracked.update({
+                'code': order.get('code'),
+                'trd_side': order.get('trd_side'),
+                'qty': order.get('qty'),
+                'dealt_qty': order.get('dealt_qty'),
+                'dealt_avg_price': order.get('dealt_avg_price'),
+                'order_status': status,
+                'updated_time': order.get('updated_time'),
+                'last_err_msg': order.get('last_err_msg'),
+            })
+            if status == OrderStatus.FILLED_ALL and 'filled_at' not in tracked:
+                tracked['filled_at'] = time.time()
+                if 'placed_at' in tracked:
+                    tracked['fill_latency'] = round(tracked['filled_at'] - tracked['placed_at'], 3)
+        self.logger.info(f"Trader: Order {order_id} {order.get('code')} {order.get('trd_side')} {status}, "
+                         f"filled {order.get('dealt_qty')}/{order.get('qty')} @ {order.get('dealt_avg_price')}"
+                         + (f", fill latency: {tracked['fill_latency']}s" if 'fill_latency' in tracked else ''))
+        if status in (OrderStatus.SUBMIT_FAILED, OrderStatus.FAILED):
+            print_status("MooMoo/Futu Trader", f"Order {order_id} failed: {order.get('last_err_msg')}", "ERROR")
+
+    def on_deal_update(self, deal):
+        deal_id = str(deal.get('deal_id'))
+        code = str(deal.get('code', ''))
+        ticker = code.split('.', 1)[1] if '.' in code else code
+        with self.cache.lock:
+            if deal.get('status') != DealStatus.OK:
+                # cancelled or changed fills, the cache can't be corrected incrementally
+                self.cache.invalidate_positions()
+            elif deal_id not in self.seen_deals and self.cache.positions_synced_at is not None:
+                self.seen_deals.add(deal_id)
+                sign = 1 if deal.get('trd_side') in (TrdSide.BUY, TrdSide.BUY_BACK) else -1
+                self.cache.positions[ticker] = self.cache.positions.get(ticker, 0) + sign * deal.get('qty', 0)
+        self.logger.info(f"Trader: Deal {deal_id} {code} {deal.get('trd_side')} {deal.get('qty')} @ {deal.get('price')}, "
+                         f"order {deal.get('order_id')}")
 
     def get_cash_balance(self):
         acct_ret, acct_info = self.get_account_info()
@@ -9,14 +9,18 @@ Angus
 
 from typing import Optional, Tuple
 
-from brokers.base_broker import BaseBroker
-from schwab.auth import easy_client, client_from_login_flow, client_from_manual_flow
+from brokers.base_broker import BaseBroker, BrokerCache
+from schwab.auth import easy_client, client_from_login_flow, client_from_manual_flow, TOKEN_ENDPOINT
 from schwab.orders.equities import equity_buy_limit, equity_sell_limit, equity_buy_market, equity_sell_market
 from schwab.orders.common import Duration, Session
+from schwab.streaming import StreamClient
 
 from env._secrete import Schwab_account_number, Schwab_app_key, Schwab_secret
 
+import asyncio
 import httpx
+import json
+import threading
 import time
 
 from trading_settings import TRADING_ALLOW_PRE_POST_MARKET_ORDER
@@ -30,6 +34,9 @@ Step 1: Set up the environment information
 # Environment Variables
 SCHWAB_CALLBACK_URL = 'https://127.0.0.1:8182'  # should be same as the Callback URL of the App in Schwab Developer Portal, just keep as default
 SCHWAB_TOKEN_PATH = './env/_schwab_token.json'
+SCHWAB_MAX_TOKEN_AGE = 60 * 60 * 24 * 6.5  # the refresh token lasts 7 days, a new login is needed after this
+TOKEN_REFRESH_AHEAD = 10 * 60  # seconds, the access token is refreshed in the background this long before expiry
+TOKEN_CHECK_INTERVAL = 60  # seconds between two checks of the background token refresh
 
 '''
 Step 2: Set up the account information
@@ -43,6 +50,12 @@ Step 3: Set up the trading information
 '''
 FILL_OUTSIDE_MARKET_HOURS = TRADING_ALLOW_PRE_POST_MARKET_ORDER  # enable if order fills on extended hours
 
+'''
+Step 4: Set up the streaming information
+'''
+USE_ACCOUNT_STREAM = True  # stream account activity, positions are then answered from memory
+STREAM_RETRY_DELAY = 10  # seconds, before the stream is logged in again after an error
+
 """ ⏫ Broker Setup ⏫ """
 
 
@@ -56,16 +69,36 @@ class SchwabBroker(BaseBroker):
         # self.connect()    #don't connect when init here, connect when needed
 
         # init the client, account_hash, and connected status
+        # the client (token file) and the account hash are loaded once, and kept for the process lifetime
         self.client = None
         self.account_hash = None
         self.connected = False
 
+        # background access token refresh, so no order waits for an OAuth refresh
+        self.token_refresher = None
+        self.token_refresher_stop = threading.Event()
+        self.token_age_warned = False
+
+        # account activity stream, on its own thread and event loop, and the state it keeps current
+        self.stream_thread = None
+        self.stream_stop = threading.Event()
+        self.stream_loop = None
+        self.stream_task = None
+        self.stream_client = None
+        self.positions_refresh = None  # background positions re-read after a fill
+        self.positions_generation = 0  # bumped on each invalidation, a re-read started before it is not valid
+        self.stream_connected = False
+        # orders: order id -> last account activity of the order, positions: symbol -> position data
+        self.cache = BrokerCache()
+
     def connect(self) -> bool:
+        if self.connected and self.client is not None:
+            return True
         while self.connection_attempts < self.max_attempts:
             try:
                 self.client = easy_client(api_key=SCHWAB_APP_KEY, app_secret=SCHWAB_SECRET,
                                           callback_url=SCHWAB_CALLBACK_URL, token_path=SCHWAB_TOKEN_PATH,
-                                          max_token_age=60 * 60 * 24 * 6.5)
+                                          max_token_age=SCHWAB_MAX_TOKEN_AGE)
 
                 ret_status_code, self.account_hash = self._get_account_hash()
                 if ret_status_code != self.ret_ok_code:
@@ -74,6 +107,9 @@ class SchwabBroker(BaseBroker):
                 self.connected = True
                 self.connection_attempts = 0
                 # self.logger.info("Successfully connected to Schwab")
+                self._start_token_refresher()
+                if USE_ACCOUNT_STREAM:
+                    self._start_stream()
                 return True
 
             except Exception as e:
@@ -87,6 +123,148 @@ class SchwabBroker(BaseBroker):
         self.logger.error("Failed to connect to Schwab after maximum attempts")
         return False
 
+    def close(self):
+        self.token_refresher_stop.set()
+        if self.token_refresher is not None:
+            self.token_refresher.join(timeout=5)
+            self.token_refresher = None
+        self._stop_stream()
+
+    def _start_token_refresher(self):
+        if self.token_refresher is not None and self.token_refresher.is_alive():
+            return
+        self.token_refresher_stop.clear()
+        self.token_refresher = threading.Thread(target=self._token_refresh_loop, name='schwab-token-refresh',
+                                                daemon=True)
+        self.token_refresher.start()
+
+    def _token_refresh_loop(self):
+        while not self.token_refresher_stop.wait(TOKEN_CHECK_INTERVAL):
+            try:
+                self._refresh_token_if_needed()
+            except Exception as e:
+                self.logger.error(f"Schwab background token refresh failed: {e}")
+
+    def _refresh_token_if_needed(self):
+        session = self.client.session
+        token = session.token
+        expires_at = token.get('expires_at') if token else None
+        # the SDK refreshes 5 minutes (leeway) before expiry on the next request, refreshing earlier keeps
+        # that refresh off the order path; the new token is written to SCHWAB_TOKEN_PATH by the SDK
+        if expires_at is not None and expires_at - time.time() < TOKEN_REFRESH_AHEAD:
+            session.refresh_token(TOKEN_ENDPOINT, refresh_token=token['refresh_token'])
+            self.logger.info("Schwab access token refreshed in the background")
+
+        if not self.token_age_warned and self.client.token_age() >= SCHWAB_MAX_TOKEN_AGE:
+            self.token_age_warned = True
+            msg = "Schwab refresh token is about to expire, delete the token file and log in again"
+            self.logger.warning(msg)
+            print_status("Trader", msg, "WARNING")
+
+    # Account activity stream, fills and order changes into the local state
+
+    def _start_stream(self):
+        if self.stream_thread is not None and self.stream_thread.is_alive():
+            return
+        self.stream_stop.clear()
+        self.stream_thread = threading.Thread(target=self._stream_thread_main, name='schwab-account-stream',
+                                              daemon=True)
+        self.stream_thread.start()
+
+    def _stop_stream(self):
+        self.stream_stop.set()
+        # handle_message holds the StreamClient lock while it waits for a message, logout would wait for it too,
+        # the task is cancelled instead, the stream thread logs out once the lock is released
+        loop, task = self.stream_loop, self.stream_task
+        if loop is not None and task is not None:
+            try:
+                loop.call_soon_threadsafe(task.cancel)
+            except RuntimeError:  # the loop is already closed
+                pass
+        if self.stream_thread is not None:
+            self.stream_thread.join(timeout=5)
+            self.stream_thread = None
+        self.stream_connected = False
+
+    def _stream_thread_main(self):
+        self.stream_loop = asyncio.new_event_loop()
+        try:
+            self.stream_task = self.stream_loop.create_task(self._stream_main())
+            try:
+                self.stream_loop.run_until_complete(self.stream_task)
+            except asyncio.CancelledError:
+                pass
+            if self.stream_client is not None:
+                try:
+                    self.stream_loop.run_until_complete(asyncio.wait_for(self.stream_client.logout(), timeout=5))
+                except Exception as e:
+                    self.logger.warning(f"Error logging out of the Schwab stream: {e}")
+        finally:
+            self.stream_loop.close()
+            self.stream_loop = None
+            self.stream_task = None
+
+    async def _stream_main(self):
+        while not self.stream_stop.is_set():
+            try:
+                self.stream_client = StreamClient(self.client)
+                await self.stream_client.login()
+                self.stream_client.add_account_activity_handler(self._on_account_activity)
+                await self.stream_client.account_activity_sub()
+                self.stream_connected = True
+                self.logger.info("Schwab account activity stream subscribed")
+                while not self.stream_stop.is_set():
+                    await self.stream_client.handle_message()
+            except Exception as e:
+                if self.stream_stop.is_set():
+                    break
+                self.logger.error(f"Schwab account activity stream failed, retry in {STREAM_RETRY_DELAY}s: {e}")
+            finally:
+                # activity is missed while the stream is down, the positions are re-read from the REST API
+                self.stream_connected = False
+                self._invalidate_positions()
+            if not self.stream_stop.is_set():
+                await asyncio.sleep(STREAM_RETRY_DELAY)
+
+    def _on_account_activity(self, msg):
+        for content in msg.get('content', []):
+            message_type = content.get('MESSAGE_TYPE')
+            raw_data = content.get('MESSAGE_DATA')
+            try:
+                data = json.loads(raw_data) if isinstance(raw_data, str) and raw_data.startswith('{') else raw_data
+            except ValueError:
+                data = raw_data
+            if not message_type or message_type == 'SUBSCRIBED':
+                continue
+
+            order_id = data.get('SchwabOrderID') if isinstance(data, dict) else None
+            if order_id is not None:
+                self.cache.order_entry(str(order_id)).update(
+                    {'type': message_type, 'data': data, 'updated_at': time.time()})
+
+            if 'Fill' in message_type:
+                # fill confirmed, the activity has no position quantity, so the positions are re-read, in the
+                # background (not on the stream loop, not on the next sell check)
+                self.logger.info(f"Schwab fill confirmed: {message_type}, order {order_id}")
+                print_status("Trader", f"Schwab fill confirmed: {message_type}, order {order_id}", "INFO")
+                self._invalidate_positions()
+                if self.positions_refresh is None or self.positions_refresh.done():
+                    self.positions_refresh = asyncio.get_running_loop().run_in_executor(None, self._refresh_positions)
+
+    def _refresh_positions(self):
+        with self.cache.lock:
+            generation = self.positions_generation
+        self.get_positions()
+        with self.cache.lock:
+            # another fill came in while reading, this result may miss it
+            if self.positions_generation != generation:
+                self.cache.invalidate_positions()
+
+    def _invalidate_positions(self):
+        with self.cache.lock:
+            self.positions_generation += 1
+            self.cache.invalidate_positions()
+
     def _get_account_hash(self) -> Tuple[int, Optional[str]]:
         resp = self.client.get_account_numbers()
         if resp.status_code != httpx.codes.OK:
@@ -182,9 +360,14 @@ class SchwabBroker(BaseBroker):
                 position_data.update(position['instrument'])
                 data_dict[code] = position_data
             self.logger.info(f"Retrieved positions: {data_dict}")
+            self.cache.seed_positions(data_dict)
             return self.ret_ok_code, data_dict
 
     def get_positions_by_ticker(self, ticker: str) -> Tuple[int, Optional[float]]:
+        with self.cache.lock:
+            if self.stream_connected and self.cache.positions_valid():
+                return self.ret_ok_code, self.cache.positions.get(ticker, {}).get('longQuantity', 0.0)
+
         ret_status_code, positions = self.get_positions()
         if ret_status_code == self.ret_ok_code:
             position = positions.get(ticker, {})
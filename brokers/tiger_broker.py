@@ -9,12 +9,13 @@ Angus
 
 from typing import Optional, Tuple
 
-from brokers.base_broker import BaseBroker
+from brokers.base_broker import BaseBroker, BrokerCache
 from tigeropen.tiger_open_config import TigerOpenClientConfig
 from tigeropen.trade.trade_client import TradeClient
 from tigeropen.common.consts import Market, SecurityType, Currency
 from tigeropen.common.util.contract_utils import stock_contract
 from tigeropen.trade.domain.order import Order
+from tigeropen.push.push_client import PushClient
 
 from env._secrete import Tiger_account_number
 
@@ -44,6 +45,13 @@ Step 3: Set up the trading information
 '''
 FILL_OUTSIDE_MARKET_HOURS = True  # enable if order fills on extended hours
 
+'''
+Step 4: Set up the push (streaming) information
+'''
+USE_PUSH_CLIENT = True  # stream asset, position and order changes, pre-trade checks then read the local cache
+CACHE_TTL = 10 * 60  # seconds, the pushed cache is re-synced with the REST API after this
+PUSH_RETRY_INTERVAL = 60  # seconds between two attempts to (re)start the push client
+
 """ ⏫ Broker Setup ⏫ """
 
 
@@ -55,10 +63,25 @@ class TigerBroker(BaseBroker):
         self.max_attempts = 3
         self.retry_delay = 5  # seconds
         # init the trade_client, account_hash, and connected status
+        # the config (props files) and the trade_client are built once, and kept for the process lifetime
+        self.client_config = None
         self.trade_client = None
         self.connected = False
 
+        # push client, and the cache it keeps current, guarded by cache.lock (callbacks run on SDK threads)
+        self.push_client = None
+        self.push_connected = False
+        self.push_attempted_at = 0.0
+        self.cache = BrokerCache(positions_ttl=CACHE_TTL)  # positions: symbol -> salable quantity
+        self.cash_available = None  # segment S, USD cash_available_for_trade
+        self.cash_synced_at = None  # None when the cached cash is not valid
+        self.pushed_cash_balance = None  # last pushed cashBalance, a change means the cash moved
+
     def connect(self) -> bool:
+        if self.connected and self.trade_client is not None:
+            if USE_PUSH_CLIENT and not self.push_connected:
+                self._start_push()
+            return True
         while self.connection_attempts < self.max_attempts:
             try:
                 self.trade_client = TradeClient(self._get_client_config())
@@ -67,6 +90,8 @@ class TigerBroker(BaseBroker):
                 self.connected = True
                 self.connection_attempts = 0
                 # self.logger.info("Successfully connected to Tiger")
+                if USE_PUSH_CLIENT:
+                    self._start_push()
                 return True
 
             except Exception as e:
@@ -81,8 +106,100 @@ class TigerBroker(BaseBroker):
         return False
 
     def _get_client_config(self) -> TigerOpenClientConfig:
-        client_config = TigerOpenClientConfig(props_path=TIGER_CONFIG_PATH)
-        return client_config
+        if self.client_config is None:
+            self.client_config = TigerOpenClientConfig(props_path=TIGER_CONFIG_PATH)
+        return self.client_config
+
+    def close(self):
+        push_client, self.push_client = self.push_client, None  # cleared first, so no reconnection
+        self.push_connected = False
+        if push_client is not None:
+            try:
+                push_client.disconnect()
+            except Exception as e:
+                self.logger.warning(f"Error disconnecting the Tiger push client: {e}")
+        self._invalidate_cache()
+
+    # Push client, asset / position / order changes into the local cache
+
+    def _start_push(self):
+        if time.time() - self.push_attempted_at < PUSH_RETRY_INTERVAL:
+            return
+        self.push_attempted_at = time.time()
+        try:
+            client_config = self._get_client_config()
+            protocol, host, port = client_config.socket_host_port
+            if self.push_client is None:
+                self.push_client = PushClient(host, port, use_ssl=(protocol == 'ssl'), client_config=client_config)
+                self.push_client.connect_callback = self._on_push_connected
+                self.push_client.disconnect_callback = self._on_push_disconnected
+                self.push_client.asset_changed = self._on_asset_changed
+                self.push_client.position_changed = self._on_position_changed
+                self.push_client.order_changed = self._on_order_changed
+            self.push_client.connect(client_config.tiger_id, client_config.private_key)
+        except Exception as e:
+            self.push_connected = False
+            self.logger.error(f"Failed to start the Tiger push client, falling back to the REST API: {e}")
+            print_status("Trader", f"Tiger push client failed, falling back to the REST API: {e}", "WARNING")
+
+    def _on_push_connected(self, frame):
+        # subscriptions don't survive a reconnection, subscribe again
+        self.push_client.subscribe_asset(account=TIGER_ACCOUNT_NUMBER)
+        self.push_client.subscribe_position(account=TIGER_ACCOUNT_NUMBER)
+        self.push_client.subscribe_order(account=TIGER_ACCOUNT_NUMBER)
+        self.push_connected = True
+        self.logger.info("Tiger push client connected, asset / position / order subscribed")
+
+    def _on_push_disconnected(self):
+        # changes are missed until the push is back, the cache is re-seeded from the REST API then
+        self.push_connected = False
+        self._invalidate_cache()
+        if self.push_client is None:  # closed
+            return
+        self.logger.warning("Tiger push client disconnected, reconnecting")
+        self.push_attempted_at = 0.0
+        self._start_push()
+
+    def _invalidate_cache(self):
+        with self.cache.lock:
+            self.cash_synced_at = None
+            self.cache.invalidate_positions()
+
+    def _invalidate_cash(self):
+        with self.cache.lock:
+            self.cash_synced_at = None
+
+    def _cache_valid(self, synced_at) -> bool:
+        return self.push_connected and synced_at is not None and time.time() - synced_at < CACHE_TTL
+
+    def _on_asset_changed(self, frame):
+        if frame.account != str(TIGER_ACCOUNT_NUMBER) or frame.segType != 'S':
+            return
+        with self.cache.lock:
+            # the push has no cash available for trade, the cached value is re-read once the cash moved
+            # (or on the first push, nothing to compare with), price-only changes (most asset pushes) keep it
+            if frame.cashBalance != self.pushed_cash_balance:
+                self.cash_synced_at = None
+            self.pushed_cash_balance = frame.cashBalance
+
+    def _on_position_changed(self, frame):
+        if frame.account != str(TIGER_ACCOUNT_NUMBER) or frame.secType != 'STK':
+            return
+        with self.cache.lock:
+            self.cache.positions[frame.symbol] = frame.salableQty
+
+    def _on_order_changed(self, frame):
+        if frame.account != str(TIGER_ACCOUNT_NUMBER):
+            return
+        with self.cache.lock:
+            # an order holds or releases cash before cashBalance moves (e.g. a working limit buy)
+            self.cash_synced_at = None
+            self.cache.order_entry(str(frame.id)).update({
+                'symbol': frame.symbol, 'action': frame.action, 'status': frame.status,
+                'filled': frame.filledQuantity, 'total': frame.totalQuantity,
+                'avg_fill_price': frame.avgFillPrice, 'updated_at': time.time()})
+        self.logger.info(f"Order {frame.id} {frame.action} {frame.symbol} {frame.status}, "
+                         f"filled {frame.filledQuantity}/{frame.totalQuantity} @ {frame.avgFillPrice}")
 
     def get_account_info(self) -> Tuple[int, Optional[dict]]:
         self.connect()
@@ -108,10 +225,17 @@ class TigerBroker(BaseBroker):
             print_status("Trader", "Get Cash Balance failed: not connected", "ERROR")
             return self.ret_error_code, None
 
+        with self.cache.lock:
+            if self._cache_valid(self.cash_synced_at):
+                return self.ret_ok_code, self.cash_available
+
         try:
             portfolio_account = self.trade_client.get_prime_assets(account=TIGER_ACCOUNT_NUMBER, base_currency='USD')
             cash_available_for_trade = portfolio_account.segments['S'].currency_assets['USD'].cash_available_for_trade
             self.logger.info(f"Retrieved cash balance: {cash_available_for_trade}")
+            with self.cache.lock:
+                self.cash_available = float(cash_available_for_trade)
+                self.cash_synced_at = time.time()
             return self.ret_ok_code, float(cash_available_for_trade)
         except Exception as e:
             self.logger.error(f"Error retrieving cash balance: {e}")
@@ -132,6 +256,7 @@ class TigerBroker(BaseBroker):
             positions = self.trade_client.get_positions(account=TIGER_ACCOUNT_NUMBER, sec_type=SecurityType.STK,
                                                         currency=Currency.USD, market=Market.US, symbol=None)
             self.logger.info(f"Retrieved positions: {positions}")
+            self.cache.seed_positions({position.contract.symbol: position.salable_qty for position in positions or []})
             return self.ret_ok_code, positions
         except Exception as e:
             self.logger.error(f"Error retrieving positions: {e}")
@@ -145,6 +270,17 @@ class TigerBroker(BaseBroker):
             print_status("Trader", "Get Positions by Ticker failed: not connected", "ERROR")
             return self.ret_error_code, None
 
+        if self.push_connected:
+            # pushed cache, seeded once with all the positions, later changes are pushed
+            if not (self.push_connected and self.cache.positions_valid()):
+                self.get_positions()
+            with self.cache.lock:
+                if self.push_connected and self.cache.positions_valid():
+                    quantity = self.cache.positions.get(ticker)
+                    if not quantity:
+                        return self.ret_error_code, 0
+                    return self.ret_ok_code, quantity
+
         try:
             position = self.trade_client.get_positions(account=TIGER_ACCOUNT_NUMBER, sec_type=SecurityType.STK,
                                                        currency=Currency.USD, market=Market.US, symbol=ticker)
@@ -167,7 +303,10 @@ class TigerBroker(BaseBroker):
             contract = stock_contract(symbol=stock, currency='USD')
             order = Order(account=TIGER_ACCOUNT_NUMBER, contract=contract, action='SELL', order_type='MKT',
                           quantity=quantity)
-            oid = self.trade_client.place_order(order)
+            try:
+                oid = self.trade_client.place_order(order)
+            finally:
+                self._invalidate_cash()  # cash available for trade changes with the order, not with the fill
             return self.ret_ok_code, None
         except Exception as e:
             self.logger.error(f"Error placing market sell order: {e}")
@@ -185,7 +324,10 @@ class TigerBroker(BaseBroker):
             contract = stock_contract(symbol=stock, currency='USD')
             order = Order(account=TIGER_ACCOUNT_NUMBER, contract=contract, action='BUY', order_type='MKT',
                           quantity=quantity)
-            oid = self.trade_client.place_order(order)
+            try:
+                oid = self.trade_client.place_order(order)
+            finally:
+                self._invalidate_cash()  # cash available for trade changes with the order, not with the fill
             return self.ret_ok_code, None
         except Exception as e:
             self.logger.error(f"Error placing market buy order: {e}")
@@ -204,7 +346,10 @@ class TigerBroker(BaseBroker):
             order = Order(account=TIGER_ACCOUNT_NUMBER, contract=contract, action='SELL', order_type='LMT',
                           quantity=quantity, limit_price=price, outside_rth=FILL_OUTSIDE_MARKET_HOURS,
                           time_in_force='GTC')
-            oid = self.trade_client.place_order(order)
+            try:
+                oid = self.trade_client.place_order(order)
+            finally:
+                self._invalidate_cash()  # cash available for trade changes with the order, not with the fill
             return self.ret_ok_code, None
         except Exception as e:
             self.logger.error(f"Error placing limit sell order: {e}")
@@ -223,7 +368,10 @@ class TigerBroker(BaseBroker):
             order = Order(account=TIGER_ACCOUNT_NUMBER, contract=contract, action='BUY', order_type='LMT',
                           quantity=quantity, limit_price=price, outside_rth=FILL_OUTSIDE_MARKET_HOURS,
                           time_in_force='GTC')
-            oid = self.trade_client.place_order(order)
+            try:
+                oid = self.trade_client.place_order(order)
+            finally:
+                self._invalidate_cash()  # cash available for trade changes with the order, not with the fill
             return self.ret_ok_code, None
         except Exception as e:
             self.logger.error(f"Error placing limit buy order: {e}")
@@ -7,7 +7,16 @@ Luke
 Angus
 """
 
+import asyncio
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
 import requests
+from requests.adapters import HTTPAdapter
 from webull import webull
 
 from brokers.base_broker import BaseBroker
@@ -21,9 +30,160 @@ from utils.wall_api_client import print_status
 
 # FILL_OUTSIDE_MARKET_HOURS = TRADING_ALLOW_PRE_POST_MARKET_ORDER  # enable if order fills on extended hours
 
+# Session, the login and the trade token are kept alive in the background
+TRADE_TOKEN_TTL = 15 * 60  # seconds, assumed lifetime of a trade token, it is renewed before this
+SESSION_REFRESH_AHEAD = 3 * 60  # seconds, the login and the trade token are renewed this long before expiry
+SESSION_CHECK_INTERVAL = 60  # seconds between two background checks
+AUTH_ERROR_MARKERS = ('token', 'auth', 'login', 'session')  # in the code / msg of a failed response
+
+# Account snapshot, one get_account() payload shared by the cash / position checks
+ACCOUNT_SNAPSHOT_TTL = 5  # seconds, dropped earlier after each order
+
+# Order history, on a keep-alive HTTP session, paged from a stored cursor
+HTTP_POOL_SIZE = 4  # kept-alive connections to the trade host
+HISTORY_PAGE_SIZE = 50  # orders per history request
+HISTORY_CURSOR_PATH = './cache/webull_history_cursor.json'  # newest createTime0 seen, per status
+
 """ ⏫ Broker Setup ⏫ """
 
 
+class WebullSession:
+    """Login and trade token of a WebullBroker, refreshed on a schedule, re-authenticated on auth errors"""
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.lock = threading.RLock()
+        self.logged_in = False
+        self.trade_token_at = None  # None when there is no valid trade token
+        self.thread = None
+        self.stop = threading.Event()
+
+    def _login_expires_at(self):
+        """Epoch seconds of the access token expiry, None if unknown"""
+        token_expire = self.broker._webull._token_expire
+        if not token_expire:
+            return None
+        try:
+            return datetime.strptime(token_expire, '%Y-%m-%dT%H:%M:%S.%f%z').timestamp()
+        except ValueError:
+            return None
+
+    def _login_valid(self) -> bool:
+        if not self.logged_in:
+            return False
+        expires_at = self._login_expires_at()
+        return expires_at is None or expires_at - time.time() > SESSION_REFRESH_AHEAD
+
+    def _trade_token_valid(self) -> bool:
+        return self.trade_token_at is not None and time.time() - self.trade_token_at < \
+            TRADE_TOKEN_TTL - SESSION_REFRESH_AHEAD
+
+    def _renew_login(self) -> bool:
+        # the refresh token first, one call, then a full login
+        if self.logged_in and self.broker._webull._refresh_token:
+            try:
+                result = self.broker._webull.refresh_login()
+                if result.get('accessToken'):
+                    self.broker.logger.info("Webull login refreshed")
+                    return True
+            except Exception as e:
+                self.broker.logger.warning(f"Webull login refresh failed: {e}")
+        self.logged_in = self.broker.is_trader_logged_in() or self.broker.log_in()
+        return self.logged_in
+
+    def ensure(self, trade: bool = True) -> bool:
+        """Valid login (and trade token), no HTTP call unless one of them is about to expire"""
+        with self.lock:
+            if not self._login_valid():
+                self.trade_token_at = None
+                if not self._renew_login():
+                    return False
+            if trade and not self._trade_token_valid():
+                if not self.broker.enable_trading():
+                    return False
+                self.trade_token_at = time.time()
+            return True
+
+    def invalidate(self):
+        with self.lock:
+            self.logged_in = False
+            self.trade_token_at = None
+
+    @staticmethod
+    def is_auth_error(response) -> bool:
+        if not isinstance(response, dict) or response.get('success', True):
+            return False
+        reason = f"{response.get('code', '')} {response.get('msg', '')}".lower()
+        return any(marker in reason for marker in AUTH_ERROR_MARKERS)
+
+    def call(self, request, *args, trade: bool = True, **kwargs):
+        """Run a Webull request, re-authenticate and retry once if it fails with an auth error"""
+        if not self.ensure(trade):
+            return {'success': False, 'msg': 'Webull session not available, log in or trade token failed'}
+        response = request(*args, **kwargs)
+        if self.is_auth_error(response):
+            self.broker.logger.warning(f"Webull auth error, re-authenticating: {response}")
+            self.invalidate()
+            if self.ensure(trade):
+                response = request(*args, **kwargs)
+        return response
+
+    def start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.stop.clear()
+        self.thread = threading.Thread(target=self._refresh_loop, name='webull-session', daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.stop.set()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+            self.thread = None
+
+    def _refresh_loop(self):
+        while not self.stop.wait(SESSION_CHECK_INTERVAL):
+            try:
+                if self.logged_in:
+                    self.ensure(trade=True)
+            except Exception as e:
+                self.broker.logger.error(f"Webull background session refresh failed: {e}")
+
+
+class WebullAccountSnapshot:
+    """Last get_account() payload, kept ACCOUNT_SNAPSHOT_TTL seconds, with its positions indexed by symbol"""
+
+    def __init__(self, broker, ttl: float = ACCOUNT_SNAPSHOT_TTL):
+        self.broker = broker
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.account_info = None
+        self.positions_by_symbol = {}  # upper case symbol -> position entry
+        self.fetched_at = None
+
+    def get(self) -> dict:
+        with self.lock:
+            if self.fetched_at is not None and time.time() - self.fetched_at < self.ttl:
+                return self.account_info
+            account_info = self.broker._webull.get_account()
+            # only a complete payload is kept, an error is returned to the caller and fetched again next time
+            if isinstance(account_info, dict) and account_info.get('accountMembers'):
+                self.account_info = account_info
+                self.positions_by_symbol = {position['ticker']['symbol'].upper(): position
+                                            for position in account_info.get('positions') or []}
+                self.fetched_at = time.time()
+            return account_info
+
+    def position(self, ticker: str) -> Optional[dict]:
+        self.get()
+        with self.lock:
+            return self.positions_by_symbol.get(ticker.upper())
+
+    def invalidate(self):
+        with self.lock:
+            self.fetched_at = None
+
+
 class WebullBroker(BaseBroker):
 
     def __init__(self):
@@ -71,13 +231,26 @@ class WebullBroker(BaseBroker):
 
         self.has_trader_info = False
 
-    def market_sell(self, stock: str, quantity: int, price: float):
-        if not self.is_trader_logged_in():
-            self.log_in()
+        # login and trade token, kept alive by the session, started on the first order
+        self.session = WebullSession(self)
+        # shared account payload, for the account / cash / position methods
+        self.account_snapshot = WebullAccountSnapshot(self)
+
+        # keep-alive session for the history requests, one TLS handshake per pooled connection
+        self.http = requests.Session()
+        self.http.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE))
+        self.history_cursor = self._load_history_cursor()
 
-        self.enable_trading()
+    def close(self):
+        self.session.close()
+        self.http.close()
+
+    def market_sell(self, stock: str, quantity: int, price: float):
+        self.session.start()
         # Sell, market order, sell 1 price, daily:
-        response = self._webull.place_order(stock=stock, action='SELL', enforce='DAY', orderType='MKT', quant=quantity)
+        response = self.session.call(self._webull.place_order, stock=stock, action='SELL', enforce='DAY',
+                                     orderType='MKT', quant=quantity)
+        self.account_snapshot.invalidate()
         # price = self.get_bid_price(stock)
         # order_details = self.print_order_details(response, stock, price, quantity, 'SELL', 'MKT')
         if response['success']:
@@ -91,12 +264,11 @@ class WebullBroker(BaseBroker):
             return self.ret_error_code, data
 
     def market_buy(self, stock: str, quantity: int, price: float):
-        if not self.is_trader_logged_in():
-            self.log_in()
-
-        self.enable_trading()
+        self.session.start()
         # Buy, market order, buy 1 price, daily:
-        response = self._webull.place_order(stock=stock, action='BUY', enforce='DAY', orderType='MKT', quant=quantity)
+        response = self.session.call(self._webull.place_order, stock=stock, action='BUY', enforce='DAY',
+                                     orderType='MKT', quant=quantity)
+        self.account_snapshot.invalidate()
         # price = self.get_ask_price(stock)
         # order_details = self.print_order_details(response, stock, price, quantity, 'BUY', 'MKT')
         if response['success']:
@@ -110,13 +282,11 @@ class WebullBroker(BaseBroker):
             return self.ret_error_code, data
 
     def limit_sell(self, stock: str, quantity: int, price: float):
-        if not self.is_trader_logged_in():
-            self.log_in()
-
-        self.enable_trading()
+        self.session.start()
         # Sell, limit price order, ask price, sell 1 price, daily:
-        response = self._webull.place_order(stock=stock, action='SELL', price=price, enforce='DAY', orderType='LMT',
-                                            quant=quantity)
+        response = self.session.call(self._webull.place_order, stock=stock, action='SELL', price=price, enforce='DAY',
+                                     orderType='LMT', quant=quantity)
+        self.account_snapshot.invalidate()
         # outsideRegularTradingHour default is True
         # order_details = self.print_order_details(response, stock, price, quantity, 'SELL', 'DAY')
         if response['success']:
@@ -130,13 +300,11 @@ class WebullBroker(BaseBroker):
             return self.ret_error_code, data
 
     def limit_buy(self, stock: str, quantity: int, price: float):
-        if not self.is_trader_logged_in():
-            self.log_in()
-
-        self.enable_trading()
+        self.session.start()
         # Buy, limit price order, bid price, buy 1 price, daily:
-        response = self._webull.place_order(stock=stock, action='BUY', price=price, enforce='DAY', orderType='LMT',
-                                            quant=quantity)
+        response = self.session.call(self._webull.place_order, stock=stock, action='BUY', price=price, enforce='DAY',
+                                     orderType='LMT', quant=quantity)
+        self.account_snapshot.invalidate()
         # order_details = self.print_order_details(response, stock, price, quantity, 'BUY', 'DAY')
         if response['success']:
             print_status("Webull Trader", "Limit Buy success", "SUCCESS")
@@ -149,7 +317,7 @@ class WebullBroker(BaseBroker):
             return self.ret_error_code, data
 
     def get_account_info(self):
-        account_info = self._webull.get_account()
+        account_info = self.account_snapshot.get()
         if account_info['secAccountId']:
             self.account_id = account_info['secAccountId']
             self.order_placed = '-'
@@ -173,7 +341,7 @@ class WebullBroker(BaseBroker):
             return self.ret_error_code, account_info
 
     def get_positions(self):
-        account_info = self._webull.get_account()
+        account_info = self.account_snapshot.get()
         if account_info['positions']:
             positions = account_info['positions']
             return self.ret_ok_code, positions
@@ -183,9 +351,8 @@ class WebullBroker(BaseBroker):
             return self.ret_error_code, account_info
 
     def get_positions_by_ticker(self, ticker: str):
-        account_info = self._webull.get_account()
+        account_info = self.account_snapshot.get()
         if account_info['positions']:
-            positions = account_info['positions']
             # ticker = position['ticker']['symbol']
             # qty = position['position']
             # marketValue = position['marketValue']
@@ -193,17 +360,17 @@ class WebullBroker(BaseBroker):
             # costPrice = position['costPrice']
             # unrealizedProfitLoss = position['unrealizedProfitLoss']
             # unrealizedProfitLossRate = round(float(position['unrealizedProfitLossRate']) * 100, 2)
-            for position in positions:
-                if position['ticker']['symbol'].lower() == ticker.lower():
-                    qty = position['position']
-                    return self.ret_ok_code, qty
+            position = self.account_snapshot.position(ticker)
+            if position is None:
+                return self.ret_ok_code, 0
+            return self.ret_ok_code, position['position']
         else:
             print_status("Webull Trader", "Get Positions failed", "ERROR")
             self.logger.warning(f'Trader: Get Positions failed: {account_info}')
             return self.ret_error_code, account_info
 
     def get_cash_balance(self):
-        account_info = self._webull.get_account()
+        account_info = self.account_snapshot.get()
         if account_info['accountMembers']:
             self.cash_balance = float(account_info['accountMembers'][1]['value'])
             return self.ret_ok_code, account_info
@@ -213,7 +380,7 @@ class WebullBroker(BaseBroker):
             return self.ret_error_code, account_info
 
     def get_cash_balance_number_only(self):
-        account_info = self._webull.get_account()
+        account_info = self.account_snapshot.get()
         if account_info['accountMembers']:
             self.cash_balance = float(account_info['accountMembers'][1]['value'])
             return self.ret_ok_code, self.cash_balance
@@ -353,18 +520,20 @@ class WebullBroker(BaseBroker):
             return False
 
     def order_limit_buy_gtc(self, stock, price, quantity=1):
-        self.enable_trading()
+        self.session.start()
         # Buy, limit price order, ask price, buy 1 price, GTC order:
-        response = self._webull.place_order(stock=stock, action='BUY', price=price, enforce='GTC', orderType='LMT',
-                                            quant=quantity)
+        response = self.session.call(self._webull.place_order, stock=stock, action='BUY', price=price, enforce='GTC',
+                                     orderType='LMT', quant=quantity)
+        self.account_snapshot.invalidate()
         order_details = self.print_order_details(response, stock, price, quantity, 'BUY', 'GTC')
         return order_details
 
     def order_limit_sell_gtc(self, stock, price, quantity=1):
-        self.enable_trading()
+        self.session.start()
         # Sell, limit price order, bid price, sell 1 price, GTC order:
-        response = self._webull.place_order(stock=stock, action='SELL', price=price, enforce='GTC', orderType='LMT',
-                                            quant=quantity)
+        response = self.session.call(self._webull.place_order, stock=stock, action='SELL', price=price, enforce='GTC',
+                                     orderType='LMT', quant=quantity)
+        self.account_snapshot.invalidate()
         order_details = self.print_order_details(response, stock, price, quantity, 'SELL', 'GTC')
         return order_details
 
@@ -391,26 +560,93 @@ class WebullBroker(BaseBroker):
             }
             return res
 
-    def get_history_orders_v2(self, status='All', count=20):
+    def get_history_orders_v2(self, status='All', count=20, last_create_time=None):
         # rewrite the get_history_orders function in the webull library
+        # last_create_time: createTime0 of the last order of the previous page, the next page starts after it
         headers = self._webull.build_req_headers(include_trade_token=True, include_time=True)
         base_ustradebroker_url = 'https://ustrade.webullbroker.com/api'
-        response = requests.get(f'{base_ustradebroker_url}/trade/v2/option/list?secAccountId={self._webull._account_id}'
-                                f'&dateType=ORDER&pageSize={count}&status=' + str(status), headers=headers,
-                                timeout=self._webull.timeout)
+        url = f'{base_ustradebroker_url}/trade/v2/option/list?secAccountId={self._webull._account_id}' \
+              f'&dateType=ORDER&pageSize={count}&status=' + str(status)
+        if last_create_time is not None:
+            url += f'&lastCreateTime0={last_create_time}'
+        response = self.http.get(url, headers=headers, timeout=self._webull.timeout)
         return response.json()
 
+    async def iter_history_orders(self, statuses=('Filled', 'Cancelled', 'Working'), page_size=HISTORY_PAGE_SIZE,
+                                  update_cursor=True):
+        """
+        Yield (status, order) newest first, page by page, down to the stored cursor of each status
+        Filled and Cancelled are final, only the orders since the last run are fetched, and the cursor moves
+        once a status is read to the end; Working orders still change, they are always listed in full.
+        """
+        loop = asyncio.get_running_loop()
+        for status in statuses:
+            since = self.history_cursor.get(status) if status != 'Working' else None
+            newest = None
+            last_create_time = None
+            complete = False  # read down to the cursor or to the last page, not stopped by an error
+            while True:
+                page = await loop.run_in_executor(None, self.get_history_orders_v2, status, page_size,
+                                                  last_create_time)
+                if not isinstance(page, list):
+                    self.logger.warning(f'Trader: Get {status} orders history failed: {page}')
+                    break
+                if not page:
+                    complete = True
+                    break
+                reached_cursor = False
+                for order in page:
+                    create_time = order.get('createTime0')
+                    if since is not None and create_time is not None and create_time <= since:
+                        reached_cursor = True
+                        break
+                    if create_time is not None and (newest is None or create_time > newest):
+                        newest = create_time
+                    yield status, order
+                last_create_time = page[-1].get('createTime0')
+                if reached_cursor or len(page) < page_size:
+                    complete = True
+                    break
+                if last_create_time is None:
+                    self.logger.warning(f'Trader: Get {status} orders history stopped, no createTime0 to page from')
+                    break
+            # the old cursor is kept after an error, the orders between it and the failed page are read next time
+            if update_cursor and complete and status != 'Working' and newest is not None:
+                self.history_cursor[status] = newest
+                self._save_history_cursor()
+
+    def _load_history_cursor(self) -> dict:
+        try:
+            with open(HISTORY_CURSOR_PATH) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_history_cursor(self):
+        try:
+            os.makedirs(os.path.dirname(HISTORY_CURSOR_PATH) or '.', exist_ok=True)
+            with open(HISTORY_CURSOR_PATH, 'w') as f:
+                json.dump(self.history_cursor, f)
+        except OSError as e:
+            self.logger.error(f'Trader: Failed to save the orders history cursor: {e}')
+
+    def _history_orders(self, status, count):
+        # orders of one status since the stored cursor (Working: all of them), newest first, count per page
+        async def collect():
+            return [order async for _, order in self.iter_history_orders((status,), page_size=count)]
+        return asyncio.run(collect())
+
     def get_filled_orders_history(self, status='Filled', count=200):
         # get filled orders
-        res = self.get_history_orders_v2(status, count)
+        res = self._history_orders(status, count)
         return res
 
     def get_cancelled_orders_history(self, status='Cancelled', count=200):
         # get cancelled orders
-        res = self.get_history_orders_v2(status, count)
+        res = self._history_orders(status, count)
         return res
 
     def get_pending_orders_history(self, status='Working', count=200):
         # get pending orders
-        res = self.get_history_orders_v2(status, count)
+        res = self._history_orders(status, count)
         return res
@@ -3,10 +3,13 @@ import signal
 import sys
 
 from brokers.broker_factory import BrokerFactory
-from env._secrete import SERVER_IP, API_CLIENT_ID, API_PASSWORD
+from env._secrete import SERVER_IP, SERVER_DOMAIN_NAME, API_CLIENT_ID, API_PASSWORD
 from trading_settings import TRADING_BROKER, TRADING_CONFIRMATION
+from utils.latency_tracker import latency_tracker, DEFAULT_REPORT_PATH
 from utils.local_decision import decision_qty
-from utils.wall_api_client import DataClient, print_status
+from utils.signal_cache import SignalDedupCache, DEFAULT_CACHE_PATH
+from utils.token_cache import TokenCache
+from utils.wall_api_client import DataClient, Signal, print_status
 from utils.logger_config import setup_logger
 
 
@@ -44,55 +47,49 @@ def trader_broker_setup_check() -> bool:
         return False
 
 
-def check_if_test_data(json_data) -> bool:
-    for k, v in json_data.items():
-        if "test" in str(k):
-            return True
-        if "test" in str(v):
-            return True
-    return False
-
-
-def handle_data(json_data):
-    """Handle incoming data"""
-    logger.debug(f"Received data: {json_data}")
+def handle_data(signal: Signal):
+    """Handle incoming data, runs on the DataClient dispatcher worker thread, off the receive loop"""
+    logger.debug(f"Received data: {signal}")
     print_status("Data Handler",
-                 f"Received data: {json_data}, type: {type(json_data)}",
+                 f"Received data: {signal}",
                  "INFO")
     print_status("Data Handler", "Starting to process data", "INFO")
 
     """
-    json_data = {
-            "time": time_now,
-            "ticker": stock,
-            "price": price,
-            "level": level,
-            "direction": direction, # Bull or Bear
-            "depth": depth,
-            "codeNum": codeNum,
-            "qty": qty, (Optional)
-        }
+    signal: decoded by DataClient, see Signal in utils/wall_api_client.py
+    time, ticker, price (float), level (L0 - L4), level_num (int), direction (Bull or Bear),
+    depth (int), code_num (int), qty (Optional), is_test,
+    coalesced: earlier signals of the same ticker and direction, merged into this one when the queue was full
     """
-    if check_if_test_data(json_data):
+    if signal.is_test:
         # test data received, no trade made
         print_status("Data Handler", "Test data received, no trade made", "INFO")
     else:
         # 1. WallTrading Bot Mode: trading data received, make trade
-        qty_num, qty_pct = decision_qty(json_data)
+        # coalesced signals are traded as one net order, at the price of the newest signal
+        qty_num, qty_pct = 0, 0
+        for merged in (*signal.coalesced, signal):
+            merged_qty, merged_pct = decision_qty(merged)
+            qty_num += merged_qty
+            qty_pct += merged_pct
+        latency_tracker.mark(signal.trace, 'decided')
+        if signal.coalesced:
+            print_status("Data Handler", f"{len(signal.coalesced) + 1} signals coalesced into one order", "INFO")
         print_status("Data Handler", f"Decision qty: {qty_num}, Decision original qty percent: {int(qty_pct * 100)} %", "INFO")
         called_by = "run_client.py - handle_data"
         if qty_num > 0:
             if TRADING_CONFIRMATION:
                 try:
                     print_status("Data Handler", "Making trade...", "INFO")
-                    client_trader.broker_make_trade(json_data["direction"], called_by, json_data["ticker"], qty_num,
-                                                    json_data["price"])
+                    client_trader.broker_make_trade(signal.direction, called_by, signal.ticker, qty_num,
+                                                    signal.price, trace=signal.trace)
                 except Exception as error:
                     print_status("Data Handler", f"Error making trade: {error}", "ERROR")
             else:
                 print_status("Data Handler", "No trade made, trading not confirmed per trading settings", "INFO")
         else:
             print_status("Data Handler", "No trade made, qty decision is 0, please check trading settings", "WARNING")
+        latency_tracker.record(signal.trace, client_trader.broker_name, signal.ticker)
 
 
 """Section 2: Client Runner Code"""
@@ -114,11 +111,13 @@ async def main():
     logger.info("Starting client process")
     # print_status("Client Runner", "Starting client process", "INFO")
 
-    # Initialize client
+    # Initialize client, both endpoints are raced on connect, the fastest one is kept
     client = DataClient(
-        server_url=f"http://{SERVER_IP}:8000",
+        server_url=[f"http://{SERVER_IP}:8000", f"http://{SERVER_DOMAIN_NAME}:8000"],
         client_id=API_CLIENT_ID,
-        password=API_PASSWORD
+        password=API_PASSWORD,
+        dedup_cache=SignalDedupCache(persist_path=DEFAULT_CACHE_PATH),
+        token_cache=TokenCache()
     )
 
     # Setup signal handlers in a cross-platform way
@@ -127,6 +126,8 @@ async def main():
         loop = asyncio.get_running_loop()
         for sig in (signal.SIGINT, signal.SIGTERM):
             loop.add_signal_handler(sig, lambda: signal_handler(sig, None))
+        # kill -USR1 <pid>: dump the signal to order latency report without stopping
+        loop.add_signal_handler(signal.SIGUSR1, lambda: latency_tracker.dump(DEFAULT_REPORT_PATH))
     else:
         logger.debug("Setting up Windows-style signal handlers")
         for sig in (signal.SIGINT, signal.SIGTERM):
@@ -166,6 +167,8 @@ async def main():
         logger.info("Initiating shutdown sequence")
         print_status("Client Runner", "Initiating shutdown sequence", "INFO")
         await client.close()
+        latency_tracker.dump(DEFAULT_REPORT_PATH)
+        client_trader.close()
 
     except Exception as e:
         logger.error(f"Unexpected error: {e}")
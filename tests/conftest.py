@@ -0,0 +1,38 @@
+import asyncio
+import socket
+import time
+
+import uvicorn
+from fastapi import FastAPI
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def make_signal(code_num: int, ticker: str = "TQQQ", direction: str = "Bull") -> dict:
+    return {"ticker": ticker, "price": 50.0, "level": "L1", "direction": direction, "depth": 1,
+            "codeNum": code_num, "time": round(time.time(), 6)}
+
+
+async def wait_until(condition, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.02)
+
+
+async def serve(app: FastAPI) -> tuple:
+    """Start app on a free local port, return (url, uvicorn server, serve task)"""
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=port, log_level='warning'))
+    task = asyncio.create_task(server.serve())
+    await wait_until(lambda: server.started)
+    return f"http://127.0.0.1:{port}", server, task
+
+
+async def shutdown(server: uvicorn.Server, task: asyncio.Task):
+    server.should_exit = True
+    await task
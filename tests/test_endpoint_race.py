@@ -0,0 +1,51 @@
+import asyncio
+
+from fastapi import FastAPI, Response
+
+from conftest import serve, shutdown
+from utils.local_server import LocalSignalServer
+from utils.wall_api_client import DataClient
+
+
+def unavailable_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/")
+    async def status():
+        return Response(status_code=503)
+
+    return app
+
+
+def slow_app(app: FastAPI, delay: float) -> FastAPI:
+    @app.middleware("http")
+    async def slow(request, call_next):
+        await asyncio.sleep(delay)
+        return await call_next(request)
+
+    return app
+
+
+async def run_status_check(healthy_too: bool):
+    servers = [await serve(unavailable_app())]
+    if healthy_too:
+        servers.append(await serve(slow_app(LocalSignalServer().app, delay=0.3)))
+    client = DataClient([url for url, _, _ in servers], 'local', 'local')
+    try:
+        return await client.check_server_status(), client.server_url, [url for url, _, _ in servers]
+    finally:
+        await client.close_http_session()
+        for _, server, task in servers:
+            await shutdown(server, task)
+
+
+def test_fast_unhealthy_endpoint_does_not_win_the_race():
+    (online, _), server_url, urls = asyncio.run(run_status_check(healthy_too=True))
+    assert online
+    assert server_url == urls[1]
+
+
+def test_status_check_fails_when_all_endpoints_are_unhealthy():
+    (online, message), _, _ = asyncio.run(run_status_check(healthy_too=False))
+    assert not online
+    assert message == "Server returned status code: 503"
@@ -0,0 +1,37 @@
+import random
+
+from utils.latency_tracker import LatencyHistogram
+
+
+def test_percentiles_are_within_one_percent_of_the_exact_values():
+    rng = random.Random(7)
+    values = [rng.lognormvariate(-4, 1) for _ in range(10_000)]  # seconds, around 20ms
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.record(value)
+
+    ordered = sorted(values)
+    for q in (50, 90, 99, 99.9):
+        exact = ordered[max(1, round(q / 100 * len(values))) - 1] * 1000
+        assert abs(histogram.percentile(q) - exact) <= exact * 0.01 + 0.001
+
+
+def test_percentiles_stay_within_the_recorded_range():
+    histogram = LatencyHistogram()
+    for seconds in (0.001, 0.002, 0.250):
+        histogram.record(seconds)
+    # bucket middles, the top one is past the max and clamped to it
+    assert 1.0 <= histogram.percentile(0) <= 1.01
+    assert 2.0 <= histogram.percentile(50) <= 2.02
+    assert histogram.percentile(100) == 250.0
+
+
+def test_negative_intervals_are_counted_as_zero():
+    histogram = LatencyHistogram()
+    histogram.record(-0.5)
+    histogram.record(0.010)
+    summary = histogram.summary()
+    assert summary['negative'] == 1
+    assert summary['min_ms'] == 0.0
+    assert summary['max_ms'] == 10.0
+    assert LatencyHistogram().percentile(50) is None
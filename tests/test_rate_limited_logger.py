@@ -0,0 +1,52 @@
+import logging
+import time
+
+from utils.logger_config import RateLimitedLogger
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def recording_logger(name: str) -> tuple:
+    logger = logging.getLogger(name)
+    logger.propagate = False
+    handler = RecordingHandler()
+    logger.handlers = [handler]
+    return logger, handler
+
+
+def test_repeats_are_counted_and_reported_with_the_next_message():
+    logger, handler = recording_logger('test_rate_limited_next')
+    limiter = RateLimitedLogger(logger, interval=0.05)
+    assert limiter.error("Connection failed", key="connect")
+    for _ in range(3):
+        assert not limiter.error("Connection failed", key="connect")
+    assert limiter.suppressed_total == 3
+
+    time.sleep(0.1)
+    assert limiter.error("Connection failed", key="connect")
+    assert handler.messages == ["Connection failed", "Connection failed (3 similar messages suppressed)"]
+
+
+def test_keys_are_limited_separately():
+    logger, _ = recording_logger('test_rate_limited_keys')
+    limiter = RateLimitedLogger(logger, interval=60)
+    assert limiter.allow("connect") == 0
+    assert limiter.allow("heartbeat") == 0
+    assert limiter.allow("connect") is None
+
+
+def test_flush_reports_the_pending_suppressed_counts():
+    logger, handler = recording_logger('test_rate_limited_flush')
+    limiter = RateLimitedLogger(logger, interval=60)
+    limiter.warning("Heartbeat failed", key="heartbeat")
+    limiter.warning("Heartbeat failed", key="heartbeat")
+    limiter.flush()
+    limiter.flush()
+    assert handler.messages == ["Heartbeat failed", "1 similar messages suppressed: heartbeat"]
@@ -0,0 +1,59 @@
+import time
+
+from conftest import make_signal
+from utils.signal_cache import SignalDedupCache
+from utils.wall_api_client import Signal
+
+
+def signal(code_num: int) -> Signal:
+    return Signal.from_dict(make_signal(code_num))
+
+
+def test_a_signal_is_seen_once():
+    cache = SignalDedupCache()
+    first = signal(1)
+    assert not cache.seen(first)
+    assert cache.seen(first)
+    assert not cache.seen(signal(2))
+    assert cache.get_stats() == {'size': 2, 'duplicates': 1, 'unique': 2}
+
+
+def test_entries_expire_after_the_ttl():
+    cache = SignalDedupCache(ttl=0.05)
+    first = signal(1)
+    cache.seen(first)
+    time.sleep(0.1)
+    assert not cache.seen(first)
+
+
+def test_the_oldest_entries_are_evicted_past_max_size():
+    cache = SignalDedupCache(max_size=2)
+    signals = [signal(code_num) for code_num in range(3)]
+    for s in signals:
+        cache.seen(s)
+    assert len(cache) == 2
+    assert not cache.seen(signals[0])
+    assert cache.seen(signals[2])
+
+
+def test_the_cache_survives_a_restart(tmp_path):
+    path = str(tmp_path / 'signal_dedup_cache.json')
+    cache = SignalDedupCache(persist_path=path, persist_interval=3600)
+    first = signal(1)
+    cache.seen(first)
+    cache.seen(signal(2))
+    cache.save()
+    assert not (tmp_path / 'signal_dedup_cache.json.tmp').exists()
+
+    restored = SignalDedupCache(persist_path=path)
+    assert len(restored) == 2
+    assert restored.seen(first)
+
+
+def test_a_restart_drops_the_expired_entries(tmp_path):
+    path = str(tmp_path / 'signal_dedup_cache.json')
+    cache = SignalDedupCache(persist_path=path)
+    cache.seen(signal(1))
+    cache.save()
+    time.sleep(0.1)
+    assert len(SignalDedupCache(ttl=0.05, persist_path=path)) == 0
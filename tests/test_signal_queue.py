@@ -0,0 +1,83 @@
+import asyncio
+
+from conftest import make_signal
+from utils.signal_queue import SignalQueue
+from utils.wall_api_client import Signal
+
+
+def signal(code_num: int, ticker: str = "TQQQ", direction: str = "Bull") -> Signal:
+    return Signal.from_dict(make_signal(code_num, ticker, direction))
+
+
+def test_drop_oldest_drops_the_oldest_queued_signal():
+    async def run():
+        queue = SignalQueue(maxsize=2, policy='drop_oldest')
+        assert queue.put_nowait(signal(1, "TQQQ"))
+        assert queue.put_nowait(signal(2, "SQQQ"))
+        assert not queue.put_nowait(signal(3, "SOXL"))
+        return [(await queue.get()).code_num for _ in range(2)], queue.get_stats()
+
+    code_nums, stats = asyncio.run(run())
+    assert code_nums == [2, 3]
+    assert stats['dropped'] == 1
+
+
+def test_coalesce_merges_same_direction_signals_of_a_lane():
+    async def run():
+        queue = SignalQueue(maxsize=1, policy='coalesce')
+        queue.put_nowait(signal(1))
+        assert queue.put_nowait(signal(2))
+        assert queue.qsize() == 1
+        merged = await queue.get()
+        queue.task_done(merged)
+
+        # the opposite direction is not merged, the oldest signal is dropped instead
+        queue.put_nowait(signal(3))
+        assert not queue.put_nowait(signal(4, direction="Bear"))
+        return merged, await queue.get(), queue.get_stats()
+
+    merged, last, stats = asyncio.run(run())
+    assert merged.code_num == 2
+    assert [s.code_num for s in merged.coalesced] == [1]
+    assert last.code_num == 4
+    assert stats['coalesced'] == 1
+    assert stats['dropped'] == 1
+
+
+def test_block_waits_for_space_until_the_queue_is_below_its_bound():
+    async def run():
+        queue = SignalQueue(maxsize=2, policy='block')
+        for code_num, ticker in ((1, "TQQQ"), (2, "SQQQ"), (3, "SOXL")):
+            assert queue.put_nowait(signal(code_num, ticker))
+        waiter = asyncio.create_task(queue.wait_for_space())
+        await queue.get()
+        await asyncio.sleep(0.05)
+        still_blocked = not waiter.done()
+        await queue.get()
+        await asyncio.wait_for(waiter, 1)
+        return still_blocked, queue.get_stats()
+
+    still_blocked, stats = asyncio.run(run())
+    assert still_blocked
+    assert stats['blocked'] == 1
+    assert stats['dropped'] == 0
+
+
+def test_a_ticker_lane_is_held_while_its_signal_is_processed():
+    async def run():
+        queue = SignalQueue(maxsize=10)
+        queue.put_nowait(signal(1, "TQQQ"))
+        queue.put_nowait(signal(2, "TQQQ"))
+        queue.put_nowait(signal(3, "SQQQ"))
+        first = await queue.get()
+        # TQQQ is busy, the other lane is served, the next TQQQ signal waits for task_done
+        second = await queue.get()
+        third = asyncio.create_task(queue.get())
+        await asyncio.sleep(0.05)
+        held = not third.done()
+        queue.task_done(first)
+        return [first.code_num, second.code_num, (await asyncio.wait_for(third, 1)).code_num], held
+
+    code_nums, held = asyncio.run(run())
+    assert code_nums == [1, 3, 2]
+    assert held
@@ -0,0 +1,102 @@
+import asyncio
+import threading
+
+import pytest
+
+from conftest import make_signal, serve, shutdown, wait_until
+from utils.local_server import LocalSignalServer
+from utils.signal_cache import SignalDedupCache
+from utils.wall_api_client import DataClient
+
+
+async def run_gap_replay(dedup_cache=None):
+    server = LocalSignalServer()
+    url, uvicorn_server, server_task = await serve(server.app)
+
+    received = []
+    lock = threading.Lock()
+
+    def on_signal(signal):
+        with lock:
+            received.append(signal.seq)
+
+    client = DataClient(url, 'local', 'local', dedup_cache=dedup_cache)
+    listen_task = asyncio.create_task(client.listen(on_signal))
+    try:
+        await wait_until(lambda: server.clients)
+        server.publish(make_signal(1))
+        server.publish(make_signal(2))
+        await wait_until(lambda: len(received) == 2)
+
+        # 3 and 4 never reach the client
+        clients = dict(server.clients)
+        server.clients.clear()
+        server.publish(make_signal(3))
+        server.publish(make_signal(4))
+        server.clients.update(clients)
+        server.publish(make_signal(5))
+
+        await wait_until(lambda: len(received) >= 5)
+        await asyncio.sleep(0.2)  # a duplicate of 5 would show up here
+        return received, client.replay_stats
+    finally:
+        await client.close()
+        listen_task.cancel()
+        await shutdown(uvicorn_server, server_task)
+
+
+@pytest.mark.parametrize('dedup_cache', [None, SignalDedupCache()], ids=['no_dedup_cache', 'dedup_cache'])
+def test_gap_is_replayed_in_order_from_the_last_signal_before_it(dedup_cache):
+    received, replay_stats = asyncio.run(run_gap_replay(dedup_cache))
+    # 5 revealed the gap, it is held until 3 and 4 are back, and its replayed copy is not dispatched again
+    assert received == [1, 2, 3, 4, 5]
+    assert replay_stats['gaps'] == 1
+    assert replay_stats['requests'] == 1
+
+
+class SilentWebSocket:
+    """A server that never answers the replay request"""
+
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, message):
+        self.sent.append(message)
+
+
+class RecordingDispatcher:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, signal):
+        self.submitted.append(signal.seq)
+
+
+async def run_unanswered_replay():
+    client = DataClient("http://127.0.0.1:1", 'local', 'local')
+    client.replay_timeout = 0.1
+    client.ws = SilentWebSocket()
+    client.dispatcher = RecordingDispatcher()
+
+    def live(seq):
+        client.handle_decoded({**make_signal(seq), 'seq': seq})
+
+    for seq in (1, 2, 5, 6):
+        live(seq)
+    held = list(client.dispatcher.submitted)
+    await wait_until(lambda: not client.replay_pending)
+    released = list(client.dispatcher.submitted)
+
+    live(9)  # gap detection is on again
+    await asyncio.sleep(0)
+    return held, released, client.replay_pending, client.replay_stats
+
+
+def test_unanswered_replay_releases_the_held_signals_and_detects_the_next_gap():
+    held, released, pending, replay_stats = asyncio.run(run_unanswered_replay())
+    assert held == [1, 2]
+    assert released == [1, 2, 5, 6]
+    assert pending
+    assert replay_stats['timeouts'] == 1
+    assert replay_stats['gaps'] == 2
+    assert replay_stats['requests'] == 2
@@ -0,0 +1,47 @@
+import base64
+import json
+import os
+import stat
+import time
+
+from utils import token_cache
+from utils.token_cache import TokenCache
+
+
+def jwt(exp: float) -> str:
+    def part(data: dict) -> str:
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip('=')
+    return f"{part({'alg': 'none'})}.{part({'exp': exp})}.signature"
+
+
+def test_the_token_file_is_only_readable_by_the_owner(tmp_path):
+    cache = TokenCache(str(tmp_path / 'token.json'))
+    cache.save('client', 'token', expires_in=3600)
+    assert stat.S_IMODE(os.stat(cache.path).st_mode) == 0o600
+    assert cache.load('client') == 'token'
+    assert cache.load('another client') is None
+
+
+def test_the_expiry_comes_from_the_jwt_exp_claim(tmp_path):
+    cache = TokenCache(str(tmp_path / 'token.json'), expiry_margin=60)
+    valid, expiring = jwt(time.time() + 3600), jwt(time.time() + 30)
+
+    cache.save('client', valid)
+    assert cache.load('client') == valid
+
+    cache.save('client', expiring)
+    assert cache.load('client') is None
+    assert not os.path.exists(cache.path)
+
+
+def test_a_failed_write_keeps_the_previous_token(tmp_path, monkeypatch):
+    cache = TokenCache(str(tmp_path / 'token.json'))
+    cache.save('client', 'old token', expires_in=3600)
+
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(token_cache.json, 'dump', fail)
+    cache.save('client', 'new token', expires_in=3600)
+    monkeypatch.undo()
+    assert cache.load('client') == 'old token'
@@ -0,0 +1,73 @@
+"""
+Decode cost of signal frames per codec: stdlib json, orjson and msgpack (whichever are installed)
+Each round decodes N frames and builds the Signal objects, like DataClient does on receive
+
+Run:
+    python -m utils.benchmark_codecs --signals 10000 --rounds 5
+"""
+
+import argparse
+import random
+import time
+
+from utils.wall_api_client import CODECS, Signal
+
+
+def make_frames(count: int) -> list:
+    frames = []
+    for seq in range(count):
+        frames.append({
+            "time": round(time.time(), 6),
+            "ticker": random.choice(["TQQQ", "SOXL", "IBIT"]),
+            "price": round(random.uniform(20, 100), 2),
+            "level": random.choice(["L0", "L1", "L2", "L3", "L4"]),
+            "direction": random.choice(["Bull", "Bear"]),
+            "depth": random.randint(0, 10),
+            "codeNum": random.choice([0, 3]),
+            "seq": seq,
+        })
+    return frames
+
+
+def benchmark(codec, frames: list, rounds: int) -> dict:
+    # text codecs encode to str and binary ones to bytes, as DataClient receives them
+    encoded = [codec.encode(frame) for frame in frames]
+    size = sum(len(frame) for frame in encoded)
+
+    best_decode = best_total = float('inf')
+    for _ in range(rounds):
+        started = time.perf_counter()
+        decoded = [codec.decode(frame) for frame in encoded]
+        decode_done = time.perf_counter()
+        for data in decoded:
+            Signal.from_dict(data)
+        total_done = time.perf_counter()
+        best_decode = min(best_decode, decode_done - started)
+        best_total = min(best_total, total_done - started)
+
+    return {
+        'codec': codec.name,
+        'bytes_per_frame': round(size / len(frames), 1),
+        'decode_ms': round(best_decode * 1000, 2),
+        'decode_and_signal_ms': round(best_total * 1000, 2),
+        'us_per_frame': round(best_total / len(frames) * 1e6, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Signal frame decode benchmark")
+    parser.add_argument('--signals', type=int, default=10000)
+    parser.add_argument('--rounds', type=int, default=5, help='best of N rounds is reported')
+    args = parser.parse_args()
+
+    frames = make_frames(args.signals)
+    print(f"Decode cost per {args.signals} signals (best of {args.rounds}), codecs: {list(CODECS)}")
+    print(f"{'codec':<10}{'bytes/frame':>14}{'decode ms':>12}{'+Signal ms':>13}{'us/frame':>11}")
+    for codec in CODECS.values():
+        result = benchmark(codec, frames, args.rounds)
+        print(f"{result['codec']:<10}{result['bytes_per_frame']:>14}{result['decode_ms']:>12}"
+              f"{result['decode_and_signal_ms']:>13}{result['us_per_frame']:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from utils.logger_config import setup_logger
+
+"""
+Signal to order latency, per pipeline stage, per broker and per ticker
+Each signal carries a trace, epoch seconds per stage:
+    server    the signal's time field, as sent by the server
+    received  the WebSocket frame is received
+    decoded   the frame is decoded into a Signal
+    decided   decision_qty is done
+    pre_trade the cash / position checks are done, right before the order call
+    ordered   the order call (market_buy, limit_buy, ...) returned
+The interval between two consecutive stages, and the end to end intervals, are kept in
+log-linear (HDR style) histograms, dumped on shutdown and on demand (SIGUSR1 on Unix).
+"""
+
+logger = setup_logger('latency_tracker')
+
+STAGES = ('server', 'received', 'decoded', 'decided', 'pre_trade', 'ordered')
+DEFAULT_REPORT_PATH = './logs/latency_report.json'
+
+
+class LatencyHistogram:
+    """Log-linear histogram of microsecond values, 2^sub_bucket_bits sub-buckets per power of two"""
+
+    def __init__(self, sub_bucket_bits: int = 7):
+        self.sub_bucket_bits = sub_bucket_bits  # 7 bits: relative error below 1%
+        self.counts: Dict[tuple, int] = {}  # (shift, mantissa) -> count, ordered like the values
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        self.negative = 0  # negative intervals, clock skew between the server and this machine
+
+    def record(self, seconds: float):
+        if seconds < 0:
+            self.negative += 1
+            seconds = 0
+        value = int(seconds * 1_000_000)
+        shift = max(0, value.bit_length() - self.sub_bucket_bits)
+        key = (shift, value >> shift)
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Value at percentile q (0 - 100), in milliseconds, the middle of its bucket"""
+        if not self.count:
+            return None
+        target = max(1, int(round(q / 100 * self.count)))
+        seen = 0
+        for shift, mantissa in sorted(self.counts):
+            seen += self.counts[(shift, mantissa)]
+            if seen >= target:
+                value = (mantissa << shift) + ((1 << shift) >> 1)
+                return round(max(min(value, self.max), self.min) / 1000, 3)
+        return round(self.max / 1000, 3)
+
+    def summary(self) -> dict:
+        if not self.count:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'min_ms': round(self.min / 1000, 3),
+            'avg_ms': round(self.total / self.count / 1000, 3),
+            'p50_ms': self.percentile(50),
+            'p90_ms': self.percentile(90),
+            'p99_ms': self.percentile(99),
+            'p999_ms': self.percentile(99.9),
+            'max_ms': round(self.max / 1000, 3),
+            'negative': self.negative,
+        }
+
+
+class LatencyTracker:
+    """Histograms per (interval, scope), scope is all, broker:<name> or ticker:<symbol>"""
+
+    def __init__(self):
+        self.histograms: Dict[tuple, LatencyHistogram] = {}
+        self.lock = threading.Lock()  # recorded on the dispatcher threads, dumped on the event loop
+        self.started_at = time.time()
+
+    @staticmethod
+    def start_trace(server_time: Optional[float] = None, received_at: Optional[float] = None) -> dict:
+        trace = {'received': received_at if received_at is not None else time.time()}
+        if server_time is not None:
+            trace['server'] = server_time
+        return trace
+
+    @staticmethod
+    def mark(trace: Optional[dict], stage: str):
+        if trace is not None:
+            trace[stage] = time.time()
+
+    def record(self, trace: Optional[dict], broker: str, ticker: str):
+        """Add the intervals of a finished trace, stages that were not reached are skipped"""
+        if not trace:
+            return
+        intervals = {}
+        reached = [stage for stage in STAGES if stage in trace]
+        for start, end in zip(reached, reached[1:]):
+            intervals[f"{start}->{end}"] = trace[end] - trace[start]
+        last = reached[-1] if reached else None
+        if 'server' in trace and last not in (None, 'server'):
+            intervals[f"server->{last} (total)"] = trace[last] - trace['server']
+        if 'received' in trace and last not in (None, 'received'):
+            intervals[f"received->{last} (local)"] = trace[last] - trace['received']
+
+        with self.lock:
+            for name, seconds in intervals.items():
+                for scope in ('all', f"broker:{broker}", f"ticker:{ticker}"):
+                    histogram = self.histograms.get((name, scope))
+                    if histogram is None:
+                        histogram = self.histograms[(name, scope)] = LatencyHistogram()
+                    histogram.record(seconds)
+
+    def report(self) -> dict:
+        with self.lock:
+            report = {}
+            for (name, scope), histogram in sorted(self.histograms.items()):
+                report.setdefault(scope, {})[name] = histogram.summary()
+            return report
+
+    def dump(self, path: Optional[str] = None) -> dict:
+        """Log the report, and write it as JSON if a path is given"""
+        report = self.report()
+        if not report:
+            logger.info("Latency report: no signal recorded yet")
+            return report
+        for scope, intervals in report.items():
+            logger.info(f"Latency report [{scope}]")
+            for name, summary in intervals.items():
+                logger.info(f"    {name:<34} n={summary['count']:<6} p50={summary.get('p50_ms')}ms "
+                            f"p99={summary.get('p99_ms')}ms max={summary.get('max_ms')}ms")
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+                with open(path, 'w') as f:
+                    json.dump({'started_at': self.started_at, 'dumped_at': time.time(), 'scopes': report}, f, indent=2)
+                logger.info(f"Latency report written to {path}")
+            except OSError as e:
+                logger.error(f"Failed to write the latency report: {e}")
+        return report
+
+
+# process wide tracker, shared by the DataClient, the message handler and the brokers
+latency_tracker = LatencyTracker()
@@ -0,0 +1,113 @@
+"""
+Load generator for the local WallTrading server (utils/local_server.py)
+Pushes signal bursts through POST /publish at a configurable rate, ticker mix, levels and directions
+
+Run:
+    python -m utils.load_generator --rate 50 --count 1000 --burst 10 --tickers TQQQ,SOXL --levels L0,L1,L2
+Trigger the reconnect paths while it runs:
+    python -m utils.load_generator --restart-every 200     # 1012 every 200 signals
+    python -m utils.load_generator --kick-every 300        # 4000 every 300 signals
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from typing import List
+
+import httpx
+
+from utils.logger_config import setup_logger
+
+logger = setup_logger('load_generator')
+
+DEFAULT_PRICES = {'TQQQ': 80.0, 'SOXL': 30.0, 'IBIT': 50.0}
+
+
+def make_signal(tickers: List[str], levels: List[str], directions: List[str]) -> dict:
+    ticker = random.choice(tickers)
+    base_price = DEFAULT_PRICES.get(ticker, 100.0)
+    return {
+        "ticker": ticker,
+        "price": round(base_price * random.uniform(0.98, 1.02), 2),
+        "level": random.choice(levels),
+        "direction": random.choice(directions),
+        "depth": random.randint(0, 10),
+        "codeNum": random.choice([0, 3]),
+        # microsecond precision, so signals of the same burst don't look like duplicates
+        "time": round(time.time(), 6),
+    }
+
+
+async def run_load(server_url: str, rate: float, count: int, burst: int, tickers: List[str], levels: List[str],
+                   directions: List[str], restart_every: int = 0, kick_every: int = 0) -> dict:
+    """Publish count signals, in bursts of burst signals, at rate signals per second overall"""
+    burst = max(1, burst)
+    interval = burst / rate if rate > 0 else 0
+    sent = 0
+    errors = 0
+    latencies = []
+    started = time.monotonic()
+
+    async with httpx.AsyncClient(base_url=server_url, timeout=10) as http:
+        next_burst = time.monotonic()
+        while sent < count:
+            batch = [make_signal(tickers, levels, directions) for _ in range(min(burst, count - sent))]
+            request_started = time.monotonic()
+            try:
+                response = await http.post("/publish", json=batch)
+                response.raise_for_status()
+                latencies.append(time.monotonic() - request_started)
+            except httpx.HTTPError as e:
+                errors += 1
+                logger.error(f"Publish failed: {e}")
+            previous = sent
+            sent += len(batch)
+
+            if restart_every and sent // restart_every > previous // restart_every:
+                await http.post("/admin/restart")
+            if kick_every and sent // kick_every > previous // kick_every:
+                await http.post("/admin/kick", json={"code": 4000})
+
+            next_burst += interval
+            delay = next_burst - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        server_stats = (await http.get("/admin/stats")).json()
+
+    elapsed = time.monotonic() - started
+    latencies.sort()
+    result = {
+        'signals': sent,
+        'errors': errors,
+        'elapsed': round(elapsed, 3),
+        'rate': round(sent / elapsed, 1) if elapsed else None,
+        'publish_p50_ms': round(latencies[len(latencies) // 2] * 1000, 2) if latencies else None,
+        'publish_max_ms': round(latencies[-1] * 1000, 2) if latencies else None,
+        'server': server_stats,
+    }
+    logger.info(f"Load finished: {result}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Signal load generator for the local WallTrading server")
+    parser.add_argument('--server', default='http://127.0.0.1:8000')
+    parser.add_argument('--rate', type=float, default=10, help='signals per second, 0 for as fast as possible')
+    parser.add_argument('--count', type=int, default=100, help='total number of signals')
+    parser.add_argument('--burst', type=int, default=1, help='signals per publish request')
+    parser.add_argument('--tickers', default='TQQQ,SOXL,IBIT')
+    parser.add_argument('--levels', default='L0,L1,L2,L3,L4')
+    parser.add_argument('--directions', default='Bull,Bear')
+    parser.add_argument('--restart-every', type=int, default=0, help='close all clients with 1012 every N signals')
+    parser.add_argument('--kick-every', type=int, default=0, help='close all clients with 4000 every N signals')
+    args = parser.parse_args()
+
+    asyncio.run(run_load(args.server, args.rate, args.count, args.burst,
+                         args.tickers.split(','), args.levels.split(','), args.directions.split(','),
+                         restart_every=args.restart_every, kick_every=args.kick_every))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,7 @@ from trading_settings import TRADING_LIST, TRADING_LEVEL, ENABLE_BUY_TQQQ, ENABL
     INITIAL_FUND_FOR_SOXL, INITIAL_FUND_FOR_IBIT, QTY_MODE, ONE_PERCENT_TRADING_QTY_FOR_TQQQ, \
     ONE_PERCENT_TRADING_QTY_FOR_SOXL, ONE_PERCENT_TRADING_QTY_FOR_IBIT, LEVEL_POSITIONS_TQQQ, LEVEL_POSITIONS_SOXL, \
     LEVEL_POSITIONS_IBIT, LEVEL_POSITIONS_DEFAULT, Bind_Depth_codeNum
-from utils.wall_api_client import print_status
+from utils.wall_api_client import print_status, Signal
 
 """
 Local decision handler for the trade
@@ -14,18 +14,18 @@ Local decision handler for the trade
 """ Please do NOT change the code below, unless you KNOW what you are doing """
 
 
-def decision_qty(json_data) -> tuple[int, float]:
+def decision_qty(signal: Signal) -> tuple[int, float]:
     """
-    :param json_data:
+    :param signal: decoded signal, fields are already validated and converted
     :return: qty, position_pct
     """
 
-    level = int(json_data["level"][1:])
-    depth = int(json_data["depth"])
-    codeNum = int(json_data["codeNum"])
-    price = float(json_data["price"])
-    stock = json_data["ticker"]
-    direction = json_data["direction"]
+    level = signal.level_num
+    depth = signal.depth
+    codeNum = signal.code_num
+    price = signal.price
+    stock = signal.ticker
+    direction = signal.direction
 
     bind_Depth_codeNum_local = Bind_Depth_codeNum  # use the global setting
 
@@ -79,7 +79,7 @@ def decision_qty(json_data) -> tuple[int, float]:
                      f"Warning, ticker not in the trading list, qty is 0, please check the trading settings",
                      "WARNING")
         return 0, position_pct
-    if json_data["level"] not in TRADING_LEVEL:
+    if signal.level not in TRADING_LEVEL:
         print_status("Decision QTY Handler",
                      f"Warning, level not in the trading level, qty is 0, please check the trading settings",
                      "WARNING")
@@ -0,0 +1,213 @@
+"""
+Local stand-in for the WallTrading server, for offline testing and benchmarking
+Implements /, /auth and /ws the way DataClient expects them:
+    GET  /      -> 200 when online
+    POST /auth  {"client_id", "password"} -> {"access_token"}, 401 on invalid credentials
+    WS   /ws    client sends {"token", "encodings": ["msgpack"]}, server answers {"status": "authenticated",
+                "encoding": "msgpack" or "json"}, or {"error": "token_expired"} (then closes with 4001)
+                if the token is unknown or expired. With msgpack, signals are sent as binary frames.
+                permessage-deflate is negotiated by uvicorn in the WebSocket handshake.
+Signal replay:
+    client -> {"action": "replay", "since_seq": 12, "since_time": ...}
+    server -> {"type": "replay", "signals": [...]}, signals after since_seq (or since_time), in order
+Admin endpoints, to simulate the real server:
+    POST /publish          one signal or a list of signals, pushed to all clients
+    POST /admin/restart    close all connections with 1012 (service restart)
+    POST /admin/kick       close all connections with {"code": 4000} (re-auth) or any other code
+    POST /admin/expire     expire all tokens, the next /ws handshake gets token_expired
+    GET  /admin/stats      connected clients, published signals
+
+Run:
+    python -m utils.local_server --port 8000 --client-id local --password local
+Load:
+    python -m utils.load_generator --rate 50 --count 1000
+"""
+
+import argparse
+import asyncio
+import json
+import secrets
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple, Union
+
+import uvicorn
+from fastapi import Body, FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+
+try:
+    import msgpack
+except ImportError:  # optional, JSON text frames only
+    msgpack = None
+
+from utils.logger_config import setup_logger
+from utils.time_tool import parse_signal_time
+
+logger = setup_logger('local_server')
+
+
+class LocalSignalServer:
+    def __init__(self, client_id: str = 'local', password: str = 'local', history_size: int = 1000,
+                 token_ttl: float = 24 * 60 * 60):
+        self.credentials = {client_id: password}
+        self.token_ttl = token_ttl  # seconds
+        self.tokens: Dict[str, Tuple[str, float]] = {}  # access token -> (client id, expiry time)
+        self.history = deque(maxlen=history_size)  # recent signals, for replay
+        self.seq = 0
+        self.clients: Dict[asyncio.Queue, WebSocket] = {}  # one outgoing queue per connected client
+        self.stats = {'connections': 0, 'published': 0, 'sent': 0, 'dropped': 0}
+        self.app = self._build_app()
+
+    def publish(self, signal: dict) -> dict:
+        """Stamp a signal with a sequence number and time, keep it for replay and push it to all clients"""
+        self.seq += 1
+        signal = {**signal, 'seq': self.seq}
+        signal.setdefault('time', round(time.time(), 3))
+        self.history.append(signal)
+        self.stats['published'] += 1
+        for queue in self.clients:
+            queue.put_nowait(signal)
+        return signal
+
+    def issue_token(self, client_id: str) -> str:
+        token = secrets.token_urlsafe(32)
+        self.tokens[token] = (client_id, time.time() + self.token_ttl)
+        return token
+
+    def check_token(self, token) -> Optional[str]:
+        """Client id of a valid token, None if unknown or expired"""
+        client_id, expires_at = self.tokens.get(token, (None, 0))
+        if client_id is None or time.time() >= expires_at:
+            self.tokens.pop(token, None)
+            return None
+        return client_id
+
+    async def close_all(self, code: int, reason: str = '') -> int:
+        """Close every client connection with the given close code"""
+        websockets = list(self.clients.values())
+        for websocket in websockets:
+            try:
+                await websocket.close(code=code, reason=reason)
+            except Exception as e:
+                logger.debug(f"Close failed: {e}")
+        logger.info(f"Closed {len(websockets)} connection(s) with code {code}")
+        return len(websockets)
+
+    def replay(self, since_seq: Optional[int] = None, since_time=None) -> List[dict]:
+        if since_seq is not None:
+            return [signal for signal in self.history if signal['seq'] > since_seq]
+        since = parse_signal_time(since_time)
+        if since is None:
+            return []
+        return [signal for signal in self.history
+                if (parse_signal_time(signal.get('time')) or 0) > since]
+
+    async def _sender(self, websocket: WebSocket, queue: asyncio.Queue, encoding: str):
+        while True:
+            message = await queue.get()
+            try:
+                if encoding == 'msgpack':
+                    await websocket.send_bytes(msgpack.packb(message, use_bin_type=True))
+                else:
+                    await websocket.send_text(json.dumps(message))
+                self.stats['sent'] += 1
+            except Exception:
+                self.stats['dropped'] += 1
+                return
+
+    async def handle_ws(self, websocket: WebSocket):
+        await websocket.accept()
+        try:
+            auth = json.loads(await websocket.receive_text())
+        except (WebSocketDisconnect, ValueError):
+            return
+
+        client_id = self.check_token(auth.get('token')) if isinstance(auth, dict) else None
+        if client_id is None:
+            await websocket.send_text(json.dumps({"error": "token_expired"}))
+            await websocket.close(code=4001)
+            return
+        encoding = 'msgpack' if msgpack is not None and 'msgpack' in (auth.get('encodings') or []) else 'json'
+        await websocket.send_text(json.dumps({"status": "authenticated", "client_id": client_id,
+                                              "encoding": encoding}))
+        logger.info(f"Client {client_id} connected, encoding: {encoding}")
+
+        queue = asyncio.Queue()
+        self.clients[queue] = websocket
+        self.stats['connections'] += 1
+        sender = asyncio.create_task(self._sender(websocket, queue, encoding))
+        try:
+            while True:
+                message = json.loads(await websocket.receive_text())
+                if isinstance(message, dict) and message.get('action') == 'replay':
+                    signals = self.replay(message.get('since_seq'), message.get('since_time'))
+                    logger.info(f"Replay for {client_id}: {len(signals)} signal(s)")
+                    # same queue as the live signals, so the client sees them in send order
+                    queue.put_nowait({"type": "replay", "signals": signals})
+        except (WebSocketDisconnect, ValueError):
+            pass
+        finally:
+            self.clients.pop(queue, None)
+            sender.cancel()
+            logger.info(f"Client {client_id} disconnected")
+
+    def _build_app(self) -> FastAPI:
+        app = FastAPI(title="WallTrading local server")
+
+        @app.get("/")
+        async def status():
+            return {"status": "online"}
+
+        @app.post("/auth")
+        async def auth(payload: dict = Body(...)):
+            client_id = payload.get("client_id")
+            if client_id not in self.credentials or self.credentials[client_id] != payload.get("password"):
+                raise HTTPException(status_code=401, detail="Invalid credentials")
+            return {"access_token": self.issue_token(client_id), "token_type": "bearer",
+                    "expires_in": self.token_ttl}
+
+        @app.post("/publish")
+        async def publish(payload: Union[dict, list] = Body(...)):
+            if isinstance(payload, list):
+                return {"published": [self.publish(signal)['seq'] for signal in payload]}
+            return self.publish(payload)
+
+        @app.post("/admin/restart")
+        async def restart():
+            return {"closed": await self.close_all(1012, "Service Restart")}
+
+        @app.post("/admin/kick")
+        async def kick(payload: dict = Body(default={})):
+            return {"closed": await self.close_all(int(payload.get("code", 4000)), payload.get("reason", ""))}
+
+        @app.post("/admin/expire")
+        async def expire():
+            expired = len(self.tokens)
+            self.tokens.clear()
+            return {"expired": expired}
+
+        @app.get("/admin/stats")
+        async def stats():
+            return {**self.stats, 'clients': len(self.clients), 'seq': self.seq}
+
+        @app.websocket("/ws")
+        async def ws(websocket: WebSocket):
+            await self.handle_ws(websocket)
+
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the WallTrading server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--client-id', default='local')
+    parser.add_argument('--password', default='local')
+    parser.add_argument('--token-ttl', type=float, default=24 * 60 * 60, help='token lifetime in seconds')
+    args = parser.parse_args()
+
+    server = LocalSignalServer(client_id=args.client_id, password=args.password, token_ttl=args.token_ttl)
+    uvicorn.run(server.app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,10 @@
 import logging
 import sys
+import threading
+import time
 from datetime import datetime
 import os
+from typing import Optional
 from logging.handlers import RotatingFileHandler
 
 # Create logs directory if it doesn't exist
@@ -67,3 +70,74 @@ def setup_logger(name):
     logger.addHandler(file_handler)
 
     return logger
+
+
+class RateLimitedLogger:
+    """
+    Log a message at most once per interval per key, repeats are counted instead of written
+    The next message of the key, or flush(), reports "N similar messages suppressed",
+    so a reconnect storm costs one log line per interval instead of one per attempt.
+    """
+
+    def __init__(self, logger: logging.Logger, interval: float = 60, max_keys: int = 1000):
+        self.logger = logger
+        self.interval = interval  # seconds
+        self.max_keys = max_keys
+        self._keys = {}  # key -> [last logged time, suppressed count, level]
+        self._last_sweep = time.monotonic()
+        self._lock = threading.Lock()  # also used from the dispatcher worker threads
+        self.suppressed_total = 0
+
+    def allow(self, key: str, level: int = logging.ERROR) -> Optional[int]:
+        """Number of messages suppressed since the key was last logged, None if this one is suppressed too"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._keys.get(key)
+            if entry is not None and now - entry[0] < self.interval:
+                entry[1] += 1
+                self.suppressed_total += 1
+                return None
+            suppressed = entry[1] if entry is not None else 0
+            if entry is None and len(self._keys) >= self.max_keys:
+                self._keys.pop(next(iter(self._keys)))
+            self._keys[key] = [now, 0, level]
+        self._sweep(now)
+        return suppressed
+
+    def log(self, level: int, msg: str, key: Optional[str] = None) -> bool:
+        """Log msg unless its key (msg itself by default) was logged within the interval, True if logged"""
+        suppressed = self.allow(key if key is not None else msg, level)
+        if suppressed is None:
+            return False
+        if suppressed:
+            msg = f"{msg} ({suppressed} similar messages suppressed)"
+        self.logger.log(level, msg)
+        return True
+
+    def error(self, msg: str, key: Optional[str] = None) -> bool:
+        return self.log(logging.ERROR, msg, key)
+
+    def warning(self, msg: str, key: Optional[str] = None) -> bool:
+        return self.log(logging.WARNING, msg, key)
+
+    def info(self, msg: str, key: Optional[str] = None) -> bool:
+        return self.log(logging.INFO, msg, key)
+
+    def _sweep(self, now: float):
+        """Report the keys that went quiet with messages still suppressed, at most once per interval"""
+        if now - self._last_sweep < self.interval:
+            return
+        self._last_sweep = now
+        self.flush(expired_only=True)
+
+    def flush(self, expired_only: bool = False):
+        """Write the pending suppressed counts, e.g. on shutdown"""
+        now = time.monotonic()
+        pending = []
+        with self._lock:
+            for key, entry in self._keys.items():
+                if entry[1] and (not expired_only or now - entry[0] >= self.interval):
+                    pending.append((key, entry[1], entry[2]))
+                    entry[1] = 0
+        for key, suppressed, level in pending:
+            self.logger.log(level, f"{suppressed} similar messages suppressed: {key}")
@@ -0,0 +1,122 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from utils.logger_config import setup_logger
+
+"""
+Signal de-duplication cache
+After a server restart (1012) or a re-auth (4000) the server can re-send recent signals,
+the cache drops them before they reach the decision stage and the broker.
+"""
+
+logger = setup_logger('signal_cache')
+
+DEFAULT_CACHE_PATH = './cache/signal_dedup_cache.json'
+
+
+class SignalDedupCache:
+    """Bounded TTL/LRU index of recently seen signals, optionally persisted to disk"""
+
+    def __init__(self, ttl: float = 6 * 60 * 60, max_size: int = 1000, persist_path: Optional[str] = None,
+                 persist_interval: float = 5):
+        self.ttl = ttl  # seconds a signal is remembered
+        self.max_size = max_size
+        self.persist_path = persist_path
+        self.persist_interval = persist_interval  # minimum seconds between two writes to disk
+        # key -> first seen time (epoch), insertion ordered, so the oldest entries are at the front
+        self._entries: OrderedDict = OrderedDict()
+        self._dirty = False
+        self._last_save = 0.0
+        self._writer: Optional[threading.Thread] = None  # background save, seen() runs on the receive loop
+        self.hits = 0
+        self.misses = 0
+        if self.persist_path:
+            self.load()
+
+    @staticmethod
+    def key_of(signal) -> Tuple:
+        return (str(signal.time), signal.ticker, signal.level, signal.depth, signal.code_num, signal.direction)
+
+    def _evict(self, now: float):
+        while self._entries:
+            key, seen_at = next(iter(self._entries.items()))
+            if now - seen_at < self.ttl and len(self._entries) <= self.max_size:
+                break
+            self._entries.popitem(last=False)
+            self._dirty = True
+
+    def seen(self, signal) -> bool:
+        """Return True if the signal was already seen, otherwise remember it and return False"""
+        now = time.time()
+        self._evict(now)
+        key = self.key_of(signal)
+        if key in self._entries:
+            self.hits += 1
+            return True
+
+        self.misses += 1
+        self._entries[key] = now
+        self._dirty = True
+        self._evict(now)
+        if self.persist_path and now - self._last_save >= self.persist_interval:
+            self._save_in_background()
+        return False
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_stats(self) -> dict:
+        return {'size': len(self._entries), 'duplicates': self.hits, 'unique': self.misses}
+
+    def load(self):
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return
+        try:
+            with open(self.persist_path, 'r') as f:
+                items = json.load(f)
+            now = time.time()
+            for key, seen_at in sorted(items, key=lambda item: item[1]):
+                if now - seen_at < self.ttl:
+                    self._entries[tuple(key)] = seen_at
+            self._evict(now)
+            logger.info(f"Loaded {len(self._entries)} recent signal(s) from {self.persist_path}")
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"Failed to load the signal cache, starting empty: {e}")
+            self._entries.clear()
+
+    def _snapshot(self) -> list:
+        self._dirty = False
+        self._last_save = time.time()
+        return [[list(key), seen_at] for key, seen_at in self._entries.items()]
+
+    def _save_in_background(self):
+        """Write a snapshot on a worker thread, skipped while the previous write is still running"""
+        if self._writer is not None and self._writer.is_alive():
+            return
+        self._writer = threading.Thread(target=self._write, args=(self._snapshot(),), name='signal-cache-save',
+                                        daemon=True)
+        self._writer.start()
+
+    def save(self):
+        """Write the cache to disk now, only if it changed, called on close"""
+        if self._writer is not None:
+            self._writer.join()
+        if not self.persist_path or not self._dirty:
+            return
+        self._write(self._snapshot())
+
+    def _write(self, items: list):
+        """Atomic replace of the cache file"""
+        try:
+            os.makedirs(os.path.dirname(self.persist_path) or '.', exist_ok=True)
+            tmp_path = f"{self.persist_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(items, f)
+            os.replace(tmp_path, self.persist_path)
+        except OSError as e:
+            logger.error(f"Failed to save the signal cache: {e}")
+            self._dirty = True
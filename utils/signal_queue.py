@@ -0,0 +1,169 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Any, Optional
+
+from utils.logger_config import setup_logger
+
+"""
+Bounded signal queue between DataClient.listen and the message callback
+One lane (FIFO) per ticker, lanes are served round-robin, so a burst on one ticker doesn't delay the others,
+and a lane is held while one of its signals is processed, so orders of a ticker stay in signal order.
+Overflow policies, when the queue is full:
+    block         the receive loop stops reading until there is room again (backpressure to the server)
+    drop_oldest   the oldest queued signal is dropped
+    coalesce      the new signal is merged with the last queued signal of its lane, if it has the same
+                  direction, into one net order (signal.coalesced), otherwise the oldest signal is dropped
+"""
+
+logger = setup_logger('signal_queue')
+
+OVERFLOW_POLICIES = ('block', 'drop_oldest', 'coalesce')
+
+
+class SignalQueue:
+    """Per-ticker lanes of (enqueue time, signal), bounded by maxsize over all lanes"""
+
+    def __init__(self, maxsize: int = 100, policy: str = 'coalesce', wait_history_size: int = 1000):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {policy}, expected one of {OVERFLOW_POLICIES}")
+        self.maxsize = max(1, maxsize)
+        self.policy = policy
+        self._lanes: OrderedDict = OrderedDict()  # ticker -> deque of (enqueued_at, signal)
+        self._busy = set()  # tickers with a signal being processed
+        self._size = 0
+        self._unfinished = 0
+        self._ready = asyncio.Event()
+        self._space = asyncio.Event()
+        self._space.set()
+        self._finished = asyncio.Event()
+        self._finished.set()
+        self.wait_times = deque(maxlen=wait_history_size)  # seconds between enqueue and dequeue
+        self.stats = {'queued': 0, 'processed': 0, 'dropped': 0, 'coalesced': 0, 'max_depth': 0, 'blocked': 0}
+
+    def qsize(self) -> int:
+        return self._size
+
+    def full(self) -> bool:
+        return self._size >= self.maxsize
+
+    def empty(self) -> bool:
+        return self._size == 0
+
+    def put_nowait(self, signal: Any) -> bool:
+        """Queue a signal, never waits, returns False if a signal (this or an older one) was dropped"""
+        accepted = True
+        if self.full():
+            if self.policy == 'coalesce' and self._coalesce(self._lanes.get(signal.ticker), signal):
+                return True
+            if self.policy != 'block':
+                self._drop_oldest()
+                accepted = False
+            # block: accepted over the bound, the receive loop waits in wait_for_space() before the next frame
+
+        self._lanes.setdefault(signal.ticker, deque()).append((time.monotonic(), signal))
+        self._size += 1
+        self._unfinished += 1
+        self.stats['queued'] += 1
+        self.stats['max_depth'] = max(self.stats['max_depth'], self._size)
+        self._finished.clear()
+        if self.full():
+            self._space.clear()
+        if signal.ticker not in self._busy:
+            self._ready.set()
+        return accepted
+
+    def _coalesce(self, lane: Optional[deque], signal: Any) -> bool:
+        """Merge signal into the last queued signal of its lane, if both go the same direction"""
+        if not lane or signal.is_test:
+            return False
+        enqueued_at, last = lane[-1]
+        if last.is_test or last.direction != signal.direction:
+            return False
+        # the newest signal carries the merged ones, the wait time counts from the oldest
+        signal.coalesced = (*last.coalesced, last)
+        last.coalesced = ()
+        lane[-1] = (enqueued_at, signal)
+        self.stats['coalesced'] += 1
+        logger.info(f"Signal coalesced into one {signal.direction} order for {signal.ticker}, "
+                    f"{len(signal.coalesced) + 1} signal(s)")
+        return True
+
+    def _drop_oldest(self):
+        oldest = None
+        for ticker, lane in self._lanes.items():
+            if lane and (oldest is None or lane[0][0] < self._lanes[oldest][0][0]):
+                oldest = ticker
+        if oldest is None:
+            return
+        _, dropped = self._lanes[oldest].popleft()
+        if not self._lanes[oldest]:
+            del self._lanes[oldest]
+        self._size -= 1
+        self._task_finished()
+        self.stats['dropped'] += 1
+        logger.error(f"Signal queue full ({self.maxsize}), oldest signal dropped: {dropped}")
+
+    def _pop(self) -> Optional[Any]:
+        """Next signal of the next idle lane, round-robin over the tickers"""
+        for ticker in list(self._lanes):
+            lane = self._lanes[ticker]
+            if not lane or ticker in self._busy:
+                continue
+            enqueued_at, signal = lane.popleft()
+            # rotate, so the next get() starts with the following ticker
+            self._lanes.move_to_end(ticker)
+            if not lane:
+                del self._lanes[ticker]
+            self._busy.add(ticker)
+            self._size -= 1
+            if not self.full():
+                self._space.set()
+            self.wait_times.append(time.monotonic() - enqueued_at)
+            return signal
+        return None
+
+    async def get(self) -> Any:
+        while True:
+            signal = self._pop()
+            if signal is not None:
+                return signal
+            self._ready.clear()
+            await self._ready.wait()
+
+    def task_done(self, signal: Any):
+        """Release the lane of a processed signal"""
+        self._busy.discard(signal.ticker)
+        if self._lanes.get(signal.ticker):
+            self._ready.set()
+        self.stats['processed'] += 1
+        self._task_finished()
+
+    def _task_finished(self):
+        self._unfinished -= 1
+        if self._unfinished <= 0:
+            self._unfinished = 0
+            self._finished.set()
+
+    async def wait_for_space(self):
+        """Block policy only, wait until the queue is below its bound"""
+        if self.policy != 'block' or not self.full():
+            return
+        self.stats['blocked'] += 1
+        logger.warning(f"Signal queue full ({self.maxsize}), receive paused")
+        await self._space.wait()
+
+    async def join(self):
+        await self._finished.wait()
+
+    def get_stats(self) -> dict:
+        waits = sorted(self.wait_times)
+        return {
+            **self.stats,
+            'policy': self.policy,
+            'depth': self._size,
+            'lanes': {ticker: len(lane) for ticker, lane in self._lanes.items()},
+            'wait_avg_ms': round(sum(waits) / len(waits) * 1000, 2) if waits else None,
+            'wait_p99_ms': round(waits[min(len(waits) - 1, int(len(waits) * 0.99))] * 1000, 2) if waits else None,
+            'wait_max_ms': round(waits[-1] * 1000, 2) if waits else None,
+        }
@@ -49,3 +49,43 @@ def get_current_time():
     current_time = datetime.datetime.now()
     formatted_time = current_time.strftime('%Y-%m-%d %H:%M:%S') + ' ' + f'{current_time.microsecond // 1000:03d} ms'
     return formatted_time
+
+
+SIGNAL_TIME_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M:%S.%f')
+
+
+def parse_signal_time(value, tz_name='America/New_York'):
+    """
+    Convert the signal time field to epoch seconds
+    :param value: epoch seconds/milliseconds, or a date time string, naive times are in tz_name
+    :param tz_name: time zone of naive date time strings
+    :return: epoch seconds, or None if the value can't be parsed
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        # epoch in milliseconds
+        return value / 1000 if value > 1e12 else float(value)
+
+    text = str(value).strip()
+    try:
+        number = float(text)
+        return number / 1000 if number > 1e12 else number
+    except ValueError:
+        pass
+
+    parsed = None
+    try:
+        parsed = datetime.datetime.fromisoformat(text)
+    except ValueError:
+        for time_format in SIGNAL_TIME_FORMATS:
+            try:
+                parsed = datetime.datetime.strptime(text, time_format)
+                break
+            except ValueError:
+                continue
+    if parsed is None:
+        return None
+    if parsed.tzinfo is None:
+        parsed = pytz.timezone(tz_name).localize(parsed)
+    return parsed.timestamp()
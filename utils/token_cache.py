@@ -0,0 +1,85 @@
+import base64
+import json
+import os
+import time
+from typing import Optional
+
+from utils.logger_config import setup_logger
+
+"""
+WallTrading access token cache
+A restart reuses the cached token on /ws directly, /auth is only called again
+when the server answers token_expired or closes with 4000/4001.
+"""
+
+logger = setup_logger('token_cache')
+
+DEFAULT_TOKEN_PATH = './env/_api_token.json'
+
+
+def _jwt_expiry(token: str) -> Optional[float]:
+    """exp claim of a JWT, without verifying it, None if the token is not a JWT"""
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(payload)).get('exp')
+        return float(exp) if exp is not None else None
+    except (IndexError, ValueError, TypeError, AttributeError):
+        return None
+
+
+class TokenCache:
+    """Persist the access token, its expiry and client id, to a file only readable by the owner"""
+
+    def __init__(self, path: str = DEFAULT_TOKEN_PATH, default_ttl: float = 12 * 60 * 60, expiry_margin: float = 60):
+        self.path = path
+        self.default_ttl = default_ttl  # seconds, when neither the server nor the token tell the expiry
+        self.expiry_margin = expiry_margin  # seconds, a token this close to expiry is not reused
+
+    def load(self, client_id: str) -> Optional[str]:
+        """Cached token of client_id, None if missing, for another client or about to expire"""
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, 'r') as f:
+                cached = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to read the token cache: {e}")
+            return None
+
+        if not isinstance(cached, dict) or cached.get('client_id') != client_id or not cached.get('access_token'):
+            return None
+        if cached.get('expires_at', 0) - self.expiry_margin <= time.time():
+            logger.info("Cached token expired")
+            self.clear()
+            return None
+        return cached['access_token']
+
+    def save(self, client_id: str, access_token: str, expires_in: Optional[float] = None):
+        now = time.time()
+        if expires_in is not None:
+            expires_at = now + float(expires_in)
+        else:
+            expires_at = _jwt_expiry(access_token) or now + self.default_ttl
+        data = {'client_id': client_id, 'access_token': access_token, 'expires_at': expires_at, 'saved_at': now}
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            # create with owner only permissions, the token is a credential
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+            os.chmod(self.path, 0o600)
+            logger.debug("Access token cached")
+        except OSError as e:
+            logger.error(f"Failed to save the token cache: {e}")
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+            logger.info("Token cache cleared")
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Failed to clear the token cache: {e}")
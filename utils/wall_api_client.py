@@ -4,13 +4,27 @@ from websockets.exceptions import ConnectionClosed
 from websockets.exceptions import InvalidMessage, InvalidStatusCode
 import asyncio
 import json
-import requests
-from typing import Callable, Optional, Tuple
+import httpx
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
 import os
-from requests.exceptions import ConnectionError, Timeout
 import time
 
-from utils.logger_config import setup_logger
+from utils.latency_tracker import latency_tracker
+from utils.logger_config import RateLimitedLogger, setup_logger
+from utils.signal_queue import SignalQueue
+from utils.time_tool import parse_signal_time
+
+try:
+    import orjson
+except ImportError:  # optional, the stdlib json codec is used instead
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional, binary frames are only negotiated when installed
+    msgpack = None
 
 # Create logs directory if it doesn't exist
 os.makedirs('./logs', exist_ok=True)
@@ -18,6 +32,9 @@ os.makedirs('./logs', exist_ok=True)
 # Setup logger
 logger = setup_logger('wall_api_client')
 
+# Time zone of the signal time field, when the server sends it without one
+SIGNAL_TIME_ZONE = 'America/New_York'
+
 # Terminal output formatting
 
 
@@ -44,10 +61,333 @@ def print_status(source: str, message: str, status: str = "INFO"):
         f"{color}[{status}] {TerminalColors.BOLD}{source}: {TerminalColors.ENDC}{message}")
 
 
+class JsonCodec:
+    """Stdlib json codec, always available"""
+    name = "json"
+    binary = False
+
+    @staticmethod
+    def decode(message: Union[str, bytes]) -> Any:
+        return json.loads(message)
+
+    @staticmethod
+    def encode(data: Any) -> str:
+        return json.dumps(data)
+
+
+class OrjsonCodec:
+    """orjson codec, decodes str or bytes frames without an extra copy"""
+    name = "orjson"
+    binary = False
+
+    @staticmethod
+    def decode(message: Union[str, bytes]) -> Any:
+        # orjson.JSONDecodeError is a subclass of json.JSONDecodeError
+        return orjson.loads(message)
+
+    @staticmethod
+    def encode(data: Any) -> str:
+        return orjson.dumps(data).decode()
+
+
+class MsgpackCodec:
+    """msgpack codec, for binary frames, decodes the received bytes directly"""
+    name = "msgpack"
+    binary = True
+
+    @staticmethod
+    def decode(message: bytes) -> Any:
+        return msgpack.unpackb(message, raw=False)
+
+    @staticmethod
+    def encode(data: Any) -> bytes:
+        return msgpack.packb(data, use_bin_type=True)
+
+
+CODECS: Dict[str, type] = {JsonCodec.name: JsonCodec}
+if orjson is not None:
+    CODECS[OrjsonCodec.name] = OrjsonCodec
+if msgpack is not None:
+    CODECS[MsgpackCodec.name] = MsgpackCodec
+
+
+def register_codec(codec: type):
+    """Register a codec class, it needs a name attribute and decode/encode static methods"""
+    CODECS[codec.name] = codec
+
+
+def get_codec(name: Optional[str] = None) -> type:
+    """Get a codec by name, default to the fastest available text (JSON) one"""
+    if name is None:
+        return CODECS.get(OrjsonCodec.name, JsonCodec)
+    if name not in CODECS:
+        raise ValueError(f"Unsupported codec: {name}, available: {list(CODECS)}")
+    return CODECS[name]
+
+
+def _has_test_marker(data: dict) -> bool:
+    for k, v in data.items():
+        if "test" in str(k) or "test" in str(v):
+            return True
+    return False
+
+
+class Signal:
+    """
+    A trading signal, decoded once into validated and pre-converted fields
+    data = {
+            "time": time_now,
+            "ticker": stock,
+            "price": price,
+            "level": level,  # L0 - L4
+            "direction": direction, # Bull or Bear
+            "depth": depth,
+            "codeNum": codeNum,
+            "qty": qty, (Optional)
+            "seq": seq, (Optional, server sequence number, "id" is accepted too)
+        }
+    """
+    __slots__ = ('time', 'ticker', 'price', 'level', 'level_num', 'direction', 'depth', 'code_num', 'qty',
+                 'is_test', 'seq', 'timestamp', 'raw', 'coalesced', 'trace')
+
+    def __init__(self, time, ticker: str, price: float, level: str, level_num: int, direction: str, depth: int,
+                 code_num: int, qty: Optional[int] = None, is_test: bool = False, seq: Optional[int] = None,
+                 timestamp: Optional[float] = None, raw: Optional[dict] = None):
+        self.time = time
+        self.ticker = ticker
+        self.price = price
+        self.level = level
+        self.level_num = level_num
+        self.direction = direction
+        self.depth = depth
+        self.code_num = code_num
+        self.qty = qty
+        self.is_test = is_test
+        self.seq = seq
+        self.timestamp = timestamp  # epoch seconds of the time field, None if it can't be parsed
+        self.raw = raw if raw is not None else {}
+        self.coalesced = ()  # earlier same ticker/direction signals merged into this one by the SignalQueue
+        self.trace: Optional[dict] = None  # stage timestamps, see utils/latency_tracker.py
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Signal':
+        """Validate and convert a decoded message, raise ValueError if it is not a signal"""
+        if not isinstance(data, dict):
+            raise ValueError(f"Signal must be an object, got {type(data).__name__}")
+
+        # test data may come without trading fields, it is never traded
+        is_test = _has_test_marker(data)
+        seq = data.get("seq", data.get("id"))
+        try:
+            seq = int(seq) if seq is not None else None
+        except (ValueError, TypeError):
+            seq = None
+        timestamp = parse_signal_time(data.get("time"), SIGNAL_TIME_ZONE)
+        try:
+            level = str(data["level"])
+            signal = cls(
+                time=data.get("time"),
+                ticker=str(data["ticker"]),
+                price=float(data["price"]),
+                level=level,
+                level_num=int(level[1:]),
+                direction=str(data["direction"]),
+                depth=int(data["depth"]),
+                code_num=int(data["codeNum"]),
+                qty=int(data["qty"]) if data.get("qty") is not None else None,
+                is_test=is_test,
+                seq=seq,
+                timestamp=timestamp,
+                raw=data
+            )
+        except (KeyError, ValueError, TypeError) as e:
+            if is_test:
+                return cls(time=data.get("time"), ticker=str(data.get("ticker", "")), price=0.0,
+                           level=str(data.get("level", "")), level_num=-1, direction=str(data.get("direction", "")),
+                           depth=-1, code_num=-1, is_test=True, seq=seq, timestamp=timestamp, raw=data)
+            raise ValueError(f"Invalid signal field: {e!r}")
+
+        if signal.direction not in ("Bull", "Bear") and not is_test:
+            raise ValueError(f"Invalid signal direction: {signal.direction}")
+        return signal
+
+    def to_dict(self) -> dict:
+        return dict(self.raw)
+
+    def __repr__(self):
+        return (f"Signal(time={self.time}, ticker={self.ticker}, price={self.price}, level={self.level}, "
+                f"direction={self.direction}, depth={self.depth}, codeNum={self.code_num}, qty={self.qty}, "
+                f"seq={self.seq}, is_test={self.is_test}, coalesced={len(self.coalesced)})")
+
+
+# Message callbacks receive a Signal, they are either plain functions, run on the dispatcher's
+# worker threads, or coroutine functions, awaited by the dispatcher's worker tasks (they must not block)
+MessageCallback = Callable[[Signal], Union[None, Awaitable[None]]]
+
+
+def _init_dispatch_thread():
+    """Give each dispatch worker thread its own event loop, broker SDKs (ib_insync, nest_asyncio) expect one"""
+    asyncio.set_event_loop(asyncio.new_event_loop())
+
+
+class SignalDispatcher:
+    """Run message callbacks off the receive loop, through a bounded per-ticker queue and a worker pool"""
+
+    def __init__(self, callback: MessageCallback, max_workers: int = 1, queue_size: int = 100,
+                 drain_timeout: float = 10, overflow_policy: str = 'coalesce'):
+        self.callback = callback
+        self.is_async_callback = asyncio.iscoroutinefunction(callback)
+        # keep 1 worker by default, so orders reach the broker in the same order as the signals
+        self.max_workers = max(1, max_workers)
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy  # block, drop_oldest or coalesce, see utils/signal_queue.py
+        self.drain_timeout = drain_timeout  # seconds to wait for queued messages on shutdown
+        self.queue: Optional[SignalQueue] = None
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.workers: List[asyncio.Task] = []
+        self.dispatched_count = 0
+        self.failed_count = 0
+        self.dropped_count = 0
+
+    def start(self):
+        """Create the queue, the executor and the worker tasks on the running loop"""
+        if self.workers:
+            return
+        self.queue = SignalQueue(maxsize=self.queue_size, policy=self.overflow_policy)
+        if not self.is_async_callback:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                               thread_name_prefix="signal-dispatch",
+                                               initializer=_init_dispatch_thread)
+        self.workers = [asyncio.create_task(self._worker(i)) for i in range(self.max_workers)]
+        logger.info(f"Signal dispatcher started with {self.max_workers} worker(s), queue size {self.queue_size}, "
+                    f"overflow policy: {self.overflow_policy}")
+
+    def submit(self, data: Signal) -> bool:
+        """Queue a message for the workers, never waits, returns False if a message was dropped"""
+        if self.queue is None:
+            logger.error("Signal dispatcher is not started, message dropped")
+            return False
+        if self.queue.put_nowait(data):
+            logger.debug(f"Message queued for dispatch, queue depth: {self.queue.qsize()}")
+            return True
+        self.dropped_count += 1
+        print_status("Signal Dispatcher", f"Dispatch queue full ({self.queue_size}), oldest message dropped", "ERROR")
+        return False
+
+    async def wait_for_space(self):
+        """With the block policy, hold the receive loop while the queue is full"""
+        if self.queue is not None:
+            await self.queue.wait_for_space()
+
+    async def _worker(self, worker_id: int):
+        loop = asyncio.get_running_loop()
+        while True:
+            data = await self.queue.get()
+            try:
+                if self.is_async_callback:
+                    await self.callback(data)
+                else:
+                    await loop.run_in_executor(self.executor, self.callback, data)
+                self.dispatched_count += 1
+                logger.debug(f"Dispatch worker {worker_id}: message processed successfully")
+            except Exception as e:
+                self.failed_count += 1
+                logger.error(f"Error in message handler: {str(e)}")
+                print_status("Message Handler",
+                             f"Error processing message: {str(e)}", "ERROR")
+            finally:
+                self.queue.task_done(data)
+
+    async def stop(self):
+        """Drain the queue (up to drain_timeout), then stop the workers and the executor"""
+        if not self.workers:
+            return
+        if not self.queue.empty():
+            logger.info(f"Waiting for {self.queue.qsize()} queued message(s) to be processed")
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=self.drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Dispatch queue not drained after {self.drain_timeout}s, "
+                           f"{self.queue.qsize()} message(s) discarded")
+
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        if self.executor:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+        logger.info(f"Signal dispatcher stopped, processed: {self.dispatched_count}, "
+                    f"failed: {self.failed_count}, dropped: {self.dropped_count}")
+        logger.info(f"Signal queue stats: {self.queue.get_stats()}")
+
+    def get_stats(self) -> dict:
+        stats = {'processed': self.dispatched_count, 'failed': self.failed_count, 'dropped': self.dropped_count}
+        if self.queue is not None:
+            stats['queue'] = self.queue.get_stats()
+        return stats
+
+
+class RecoveryTimer:
+    """Measure the disconnect -> reconnect -> first message latency of the WebSocket connection"""
+
+    def __init__(self, history_size: int = 50):
+        self.disconnected_at: Optional[float] = None
+        self.connected_at: Optional[float] = None
+        self.waiting_first_message = False
+        self.history = deque(maxlen=history_size)
+
+    def mark_disconnected(self):
+        # keep the first drop time, until a message is received again
+        if self.disconnected_at is None:
+            self.disconnected_at = time.monotonic()
+        self.waiting_first_message = False
+
+    def mark_connected(self):
+        self.connected_at = time.monotonic()
+        self.waiting_first_message = True
+
+    def mark_message(self) -> Optional[dict]:
+        """Record the first message after a (re)connect, returns the record once per connection"""
+        if not self.waiting_first_message:
+            return None
+        now = time.monotonic()
+        self.waiting_first_message = False
+        record = {
+            'disconnect_to_reconnect': None,
+            'reconnect_to_first_message': round(now - self.connected_at, 3),
+            'disconnect_to_first_message': None,
+        }
+        if self.disconnected_at is not None:
+            record['disconnect_to_reconnect'] = round(self.connected_at - self.disconnected_at, 3)
+            record['disconnect_to_first_message'] = round(now - self.disconnected_at, 3)
+        self.disconnected_at = None
+        self.history.append(record)
+        return record
+
+    def get_stats(self) -> dict:
+        recoveries = [r['disconnect_to_first_message'] for r in self.history
+                      if r['disconnect_to_first_message'] is not None]
+        return {
+            'recoveries': len(recoveries),
+            'last': self.history[-1] if self.history else None,
+            'avg_recovery': round(sum(recoveries) / len(recoveries), 3) if recoveries else None,
+            'max_recovery': max(recoveries) if recoveries else None,
+        }
+
+
 class DataClient:
-    def __init__(self, server_url: str, client_id: str, password: str):
-        self.server_url = server_url.rstrip('/')
-        self.ws_url = server_url.replace('http', 'ws') + '/ws'
+    def __init__(self, server_url: Union[str, List[str]], client_id: str, password: str,
+                 dispatch_workers: int = 1, dispatch_queue_size: int = 100, codec: Optional[str] = None,
+                 dedup_cache=None, token_cache=None, compression: Optional[str] = "deflate",
+                 binary_encodings: Optional[List[str]] = None, overflow_policy: str = "coalesce"):
+        # One or more endpoints of the same server, raced on connect, the fastest one is kept
+        server_urls = [server_url] if isinstance(server_url, str) else list(server_url)
+        self.endpoints = [url.rstrip('/') for url in server_urls]
+        self.server_url = self.endpoints[0]
+        self.ws_url = self._ws_url_for(self.server_url)
+        self.connect_stagger = 0.25  # seconds before starting the next endpoint, happy eyeballs style
+        self.failover_pending = False  # skip the backoff once, right after the active connection drops
         self.client_id = client_id
         self.password = password
         self.token: Optional[str] = None
@@ -69,38 +409,192 @@ class DataClient:
         self.heartbeat_failed_count = 0
         self.max_heartbeat_failures = 3
         self.last_ping_time = 0  # Track last successful ping time
-        # Time to wait before starting health checks
-        self.connection_stabilization_time = 5
+        # Liveness is checked by a background task, never in the receive path
+        self.heartbeat_task: Optional[asyncio.Task] = None
+        self.heartbeat_rtts = deque(maxlen=100)  # recent ping round-trip times (seconds)
+        self.heartbeat_stats = {'pings': 0, 'failures': 0, 'reconnects': 0}
+        # Reconnect path logs, repeats of the same message are suppressed and counted for error_log_interval
+        self.error_log_interval = 60  # seconds
+        self.log_limiter = RateLimitedLogger(logger, interval=self.error_log_interval)
+        self.auth_ack_timeout = 5  # Time to wait for the server to acknowledge the token
+        self.recovery_timer = RecoveryTimer()
+        # Broker calls run on the dispatcher, never on the receive loop
+        self.dispatch_workers = dispatch_workers
+        self.dispatch_queue_size = dispatch_queue_size
+        self.overflow_policy = overflow_policy  # when the dispatch queue is full: block, drop_oldest or coalesce
+        self.dispatcher: Optional[SignalDispatcher] = None
+        # Frame decoding, orjson when installed, stdlib json otherwise
+        self.codec = get_codec(codec)
+        # Frame encoding and compression, negotiated at connect: permessage-deflate in the WebSocket
+        # handshake, a binary encoding (msgpack) in the token handshake, text frames stay JSON
+        self.compression = compression
+        if binary_encodings is None:
+            binary_encodings = [name for name, c in CODECS.items() if c.binary]
+        self.binary_encodings = [name for name in binary_encodings if name in CODECS]
+        self.binary_codec: Optional[type] = None
+        # Optional SignalDedupCache (utils/signal_cache.py), drops re-sent signals before the dispatcher
+        self.dedup_cache = dedup_cache
+        # Optional TokenCache (utils/token_cache.py), a restart tries the cached token on /ws first
+        self.token_cache = token_cache
+        # Gap detection and replay, from the last seen signal sequence number or time
+        self.replay_enabled = True
+        self.replay_max_age = 600  # seconds, older replayed signals are stale and dropped
+        self.replay_timeout = 5  # seconds to wait for a replay answer, the held signals are released after it
+        self.replay_window = 1000  # recently dispatched seqs, a replayed one of these is never dispatched again
+        self.replay_pending = False
+        self.replay_task: Optional[asyncio.Task] = None
+        self.replay_timer: Optional[asyncio.TimerHandle] = None
+        self.replay_buffer: List[Signal] = []  # live signals held while a replay is pending, released in seq order
+        self.dispatched_seqs = set()
+        self._dispatched_order = deque()
+        self.last_signal_seq: Optional[int] = None
+        self.last_signal_time = None  # raw time field of the last signal, sent back as is
+        self.replay_stats = {'requests': 0, 'gaps': 0, 'received': 0, 'processed': 0, 'stale': 0,
+                             'duplicates': 0, 'timeouts': 0}
+        # Shared keep-alive HTTP session for the status check and authentication
+        self.http_session: Optional[httpx.AsyncClient] = None
+        self.http_keepalive_expiry = 60  # seconds to keep an idle connection open
+        self.http_stats = {'requests': 0, 'new_connections': 0, 'reused_connections': 0}
+        self._http_streams = set()  # ids of the network streams seen so far
         print_status(
             "DataClient", f"Initialized for client {client_id}", "INFO")
         logger.info(
-            f"DataClient initialized for {client_id} with server URL: {server_url}")
+            f"DataClient initialized for {client_id} with server URL(s): {self.endpoints}")
+
+    def get_http_session(self) -> httpx.AsyncClient:
+        """Get the shared keep-alive HTTP session, created on first use"""
+        if self.http_session is None or self.http_session.is_closed:
+            self.http_session = httpx.AsyncClient(
+                headers={"User-Agent": "DataClient/1.0"},
+                limits=httpx.Limits(max_connections=4,
+                                    max_keepalive_connections=2,
+                                    keepalive_expiry=self.http_keepalive_expiry)
+            )
+            self._http_streams.clear()
+        return self.http_session
+
+    def _track_connection_reuse(self, response: httpx.Response):
+        """Count new and reused connections, by the identity of the response network stream"""
+        self.http_stats['requests'] += 1
+        stream = response.extensions.get("network_stream")
+        if stream is None:
+            return
+        if id(stream) in self._http_streams:
+            self.http_stats['reused_connections'] += 1
+        else:
+            self._http_streams.add(id(stream))
+            self.http_stats['new_connections'] += 1
+        logger.debug(f"HTTP connection stats: {self.http_stats}")
+
+    def get_http_stats(self) -> dict:
+        """HTTP request and connection reuse counters"""
+        return dict(self.http_stats)
+
+    async def close_http_session(self):
+        if self.http_session is not None:
+            await self.http_session.aclose()
+            self.http_session = None
+            logger.info(f"HTTP session closed, stats: {self.http_stats}")
+
+    @staticmethod
+    def _ws_url_for(server_url: str) -> str:
+        return server_url.replace('http', 'ws', 1) + '/ws'
+
+    def _set_active_endpoint(self, server_url: str):
+        if server_url != self.server_url:
+            logger.info(f"Switching server endpoint: {self.server_url} -> {server_url}")
+            print_status("Connection", f"Switching server endpoint to {server_url}", "WARNING")
+        self.server_url = server_url
+        self.ws_url = self._ws_url_for(server_url)
+
+    async def _race_endpoints(self, attempt: Callable[[str], Awaitable[Any]],
+                              discard: Optional[Callable[[Any], Awaitable[None]]] = None) -> Tuple[str, Any]:
+        """
+        Run attempt(server_url) on all endpoints, happy eyeballs style: the active endpoint starts first,
+        the next one after connect_stagger seconds, or right away if all started ones failed
+        :param attempt: coroutine function, returns a result or raises
+        :param discard: coroutine function to release the result of a late winner (e.g. close a socket)
+        :return: (server_url, result) of the first successful attempt, raise the first error if all failed
+        """
+        order = [self.server_url] + [url for url in self.endpoints if url != self.server_url]
+        stagger = 0 if self.failover_pending else self.connect_stagger
+        tasks = {}
+        errors = []
+        winner = None
+
+        async def run(url):
+            return url, await attempt(url)
 
-    async def check_server_status(self) -> Tuple[bool, str]:
-        """Check if the server is online and responding"""
         try:
-            logger.debug(f"Checking server status at {self.server_url}")
-            response = requests.get(
-                f"{self.server_url}/",
+            for index, url in enumerate(order):
+                tasks[asyncio.create_task(run(url))] = url
+                is_last = index == len(order) - 1
+                deadline = None if is_last else asyncio.get_running_loop().time() + stagger
+                while winner is None:
+                    pending = [task for task in tasks if not task.done()]
+                    if not pending:
+                        break
+                    timeout = None if deadline is None else deadline - asyncio.get_running_loop().time()
+                    if timeout is not None and timeout <= 0:
+                        break
+                    await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                    for task in tasks:
+                        if task.done() and not task.cancelled() and task.exception() is None and winner is None:
+                            winner = task.result()
+                if winner is not None:
+                    break
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            for task in tasks:
+                if task.done() and not task.cancelled():
+                    if task.exception() is not None:
+                        errors.append(task.exception())
+                        logger.debug(f"Endpoint {tasks[task]} failed: {task.exception()}")
+                    elif discard is not None and (winner is None or task.result() is not winner):
+                        await discard(task.result()[1])
+
+        if winner is None:
+            raise errors[0] if errors else ConnectionError("No server endpoint available")
+        if len(self.endpoints) > 1:
+            logger.debug(f"Endpoint race won by {winner[0]}")
+        return winner
+
+    async def check_server_status(self) -> Tuple[bool, str]:
+        """Check if the server is online and responding, on the fastest endpoint"""
+        async def get_status(server_url):
+            response = await self.get_http_session().get(
+                f"{server_url}/",
                 timeout=5
             )
-            if response.status_code == 200:
-                self.server_check_count = 0
-                logger.info(
-                    "Server status check: Server is online and responding")
-                return True, "Server is online"
+            self._track_connection_reuse(response)
+            # an unhealthy answer loses the race, a slower healthy endpoint can still win it
+            if response.status_code != 200:
+                raise httpx.HTTPStatusError(f"Server returned status code: {response.status_code}",
+                                            request=response.request, response=response)
+            return response
+
+        try:
+            logger.debug(f"Checking server status at {self.endpoints}")
+            server_url, response = await self._race_endpoints(get_status)
+            self._set_active_endpoint(server_url)
+            self.server_check_count = 0
+            logger.info(
+                "Server status check: Server is online and responding")
+            return True, "Server is online"
+        except httpx.HTTPStatusError as e:
             logger.warning(
-                f"Server returned unexpected status code: {response.status_code}")
-            return False, f"Server returned status code: {response.status_code}"
-        except ConnectionError:
-            logger.error(
-                "Server connection failed: Server is offline or unreachable")
+                f"Server returned unexpected status code: {e.response.status_code}")
+            return False, f"Server returned status code: {e.response.status_code}"
+        except httpx.ConnectError:
+            self.log_limiter.error("Server connection failed: Server is offline or unreachable")
             return False, "Server is offline or unreachable"
-        except Timeout:
-            logger.error("Server request timed out: Server is not responding")
+        except httpx.TimeoutException:
+            self.log_limiter.error("Server request timed out: Server is not responding")
             return False, "Server is not responding (timeout)"
         except Exception as e:
-            logger.error(f"Unexpected error during server check: {str(e)}")
+            self.log_limiter.error(f"Unexpected error during server check: {str(e)}", key="server_check_error")
             return False, f"Error checking server status: {str(e)}"
 
     async def authenticate(self) -> bool:
@@ -127,7 +621,7 @@ class DataClient:
                 self.auth_retry_count += 1
                 return False
 
-            response = requests.post(
+            response = await self.get_http_session().post(
                 f"{self.server_url}/auth",
                 json={
                     "client_id": self.client_id,
@@ -135,13 +629,18 @@ class DataClient:
                 },
                 timeout=10
             )
+            self._track_connection_reuse(response)
 
             if response.status_code == 200:
-                self.token = response.json()["access_token"]
+                auth_data = response.json()
+                self.token = auth_data["access_token"]
+                if self.token_cache is not None:
+                    self.token_cache.save(self.client_id, self.token, auth_data.get("expires_in"))
                 self.reconnect_attempts = 0
                 self.auth_retry_count = 0
                 self.retry_count = 0
-                logger.info("Authentication successful")
+                logger.info("Authentication successful, HTTP connections new: "
+                            f"{self.http_stats['new_connections']}, reused: {self.http_stats['reused_connections']}")
                 print_status(
                     "Authentication", "Successfully authenticated with server", "SUCCESS")
                 return True
@@ -165,6 +664,12 @@ class DataClient:
             self.auth_retry_count += 1
             return False
 
+    def _clear_token(self):
+        """Forget the access token, in memory and in the token cache"""
+        self.token = None
+        if self.token_cache is not None:
+            self.token_cache.clear()
+
     def get_retry_delay(self) -> int:
         """Calculate exponential backoff delay"""
         # Exponential backoff: base_delay * 2^retry_count
@@ -172,10 +677,10 @@ class DataClient:
             self.base_retry_delay * (2 ** self.retry_count),
             self.max_retry_delay
         )
-        logger.info(f"Retry attempt {self.retry_count + 1}, delay: {delay}s")
-        print_status("Connection",
-                     f"Retry attempt {self.retry_count + 1} of {self.max_retries}, waiting {delay}s",
-                     "INFO")
+        if self.log_limiter.info(f"Retry attempt {self.retry_count + 1}, delay: {delay}s", key="retry"):
+            print_status("Connection",
+                         f"Retry attempt {self.retry_count + 1} of {self.max_retries}, waiting {delay}s",
+                         "INFO")
         return delay
 
     async def connect(self) -> bool:
@@ -185,7 +690,7 @@ class DataClient:
                 msg = "Maximum reconnection attempts reached. Requiring re-authentication."
                 logger.error(msg)
                 print_status("Connection", msg, "ERROR")
-                self.token = None
+                self._clear_token()
                 self.auth_required = True
                 self.retry_count = 0
                 return False
@@ -201,34 +706,54 @@ class DataClient:
             print_status(
                 "Connection", "Attempting to connect to server", "INFO")
 
-            self.ws = await websockets.connect(
-                self.ws_url,
-                ping_interval=self.ping_interval,
-                ping_timeout=self.ping_timeout,
-                close_timeout=10,
-                max_size=2**23,
-                user_agent_header="DataClient/1.0"
-            )
+            async def open_ws(server_url):
+                # keepalive pings are sent by the heartbeat task, not by websockets
+                return await websockets.connect(
+                    self._ws_url_for(server_url),
+                    ping_interval=None,
+                    ping_timeout=self.ping_timeout,
+                    close_timeout=10,
+                    max_size=2**23,
+                    compression=self.compression,
+                    user_agent_header="DataClient/1.0"
+                )
+
+            async def close_ws(ws):
+                try:
+                    await ws.close()
+                except Exception:
+                    pass
+
+            server_url, self.ws = await self._race_endpoints(open_ws, discard=close_ws)
+            self._set_active_endpoint(server_url)
+            self.failover_pending = False
 
             # Send authentication token
-            auth_message = json.dumps({"token": self.token})
+            # offer binary encodings, the server picks one (or none) in its answer
+            auth_message = self.codec.encode({"token": self.token, "encodings": self.binary_encodings})
             await self.ws.send(auth_message)
             logger.debug("Authentication token sent")
 
+            # Ready as soon as the server acknowledges the token, no fixed stabilization wait
+            response_data = None
+            self.binary_codec = None
             try:
-                response = await asyncio.wait_for(self.ws.recv(), timeout=5)
-                response_data = json.loads(response)
+                response = await asyncio.wait_for(self.ws.recv(), timeout=self.auth_ack_timeout)
+                response_data = self.codec.decode(response)
 
                 # Check if server indicates token expiry
                 if isinstance(response_data, dict) and response_data.get('error') == 'token_expired':
                     logger.warning(
                         "Token expired, requiring re-authentication")
-                    self.token = None
+                    self._clear_token()
                     self.auth_required = True
                     return False
 
                 logger.info(
                     f"Server response after authentication: {response}")
+                if isinstance(response_data, dict) and response_data.get('encoding') in self.binary_encodings:
+                    self.binary_codec = CODECS[response_data['encoding']]
+                    logger.info(f"Binary frame encoding negotiated: {self.binary_codec.name}")
                 self.heartbeat_failed_count = 0
                 self.last_ping_time = time.time()
             except asyncio.TimeoutError:
@@ -237,25 +762,36 @@ class DataClient:
             except json.JSONDecodeError:
                 logger.warning("Invalid response format from server")
 
-            await asyncio.sleep(self.connection_stabilization_time)
             self.retry_count = 0
             self.auth_required = False
+            self.recovery_timer.mark_connected()
+            self._start_heartbeat()
+
+            # ask for what was pushed while we were disconnected
+            if self.replay_enabled and (self.last_signal_seq is not None or self.last_signal_time is not None):
+                await self.request_replay()
             logger.info("Successfully connected to server")
             print_status(
                 "Connection", "Successfully connected to server", "SUCCESS")
+
+            # the server may push a signal right away, don't lose it
+            if isinstance(response_data, dict) and 'ticker' in response_data:
+                self._log_recovery(self.recovery_timer.mark_message())
+                self.handle_decoded(response_data)
             return True
 
         except Exception as e:
+            self.failover_pending = False  # the immediate failover attempt is spent
             error_msg = str(e)
             if "4000" in error_msg or "private use" in error_msg:
                 logger.warning(
                     "Server indicated authentication issue, will re-authenticate")
-                self.token = None
+                self._clear_token()
                 self.auth_required = True
                 return False
 
-            logger.error(f"Connection failed: {error_msg}")
-            print_status("Connection", f"Failed: {error_msg}", "ERROR")
+            if self.log_limiter.error(f"Connection failed: {error_msg}", key="connect_failed"):
+                print_status("Connection", f"Failed: {error_msg}", "ERROR")
             self.retry_count += 1
             return False
 
@@ -268,17 +804,21 @@ class DataClient:
             # Add timeout to ping
             pong_waiter = None
             try:
+                ping_started = time.monotonic()
                 pong_waiter = await asyncio.wait_for(
                     self.ws.ping(),
                     timeout=self.ping_timeout
                 )
-                await pong_waiter
+                await asyncio.wait_for(pong_waiter, timeout=self.ping_timeout)
+                self.heartbeat_rtts.append(time.monotonic() - ping_started)
+                self.heartbeat_stats['pings'] += 1
                 self.heartbeat_failed_count = 0
                 self.last_ping_time = time.time()
                 return True
             except (asyncio.TimeoutError, asyncio.InvalidStateError,
                     ConnectionClosed, AttributeError) as e:
                 self.heartbeat_failed_count += 1
+                self.heartbeat_stats['failures'] += 1
 
                 # Special handling for server restart
                 if isinstance(e, ConnectionClosed) and e.code == 1012:
@@ -289,8 +829,8 @@ class DataClient:
                 logger.debug(
                     f"Heartbeat check failed ({self.heartbeat_failed_count}/3): {str(e)}")
                 if self.heartbeat_failed_count >= self.max_heartbeat_failures:
-                    logger.warning("Multiple heartbeat failures detected "
-                                   f"({self.heartbeat_failed_count} failures)")
+                    self.log_limiter.warning("Multiple heartbeat failures detected "
+                                             f"({self.heartbeat_failed_count} failures)", key="heartbeat_failures")
                     return False
                 return True
             finally:
@@ -301,23 +841,74 @@ class DataClient:
                         pass
 
         except Exception as e:
-            logger.error(f"Error in connection health check: {str(e)}")
+            self.log_limiter.error(f"Error in connection health check: {str(e)}", key="health_check_error")
             self.heartbeat_failed_count += 1
+            self.heartbeat_stats['failures'] += 1
             return False
 
+    def _start_heartbeat(self):
+        self._stop_heartbeat()
+        self.heartbeat_failed_count = 0
+        self.heartbeat_task = asyncio.create_task(self._heartbeat_loop(self.ws))
+
+    def _stop_heartbeat(self):
+        if self.heartbeat_task and not self.heartbeat_task.done():
+            self.heartbeat_task.cancel()
+        self.heartbeat_task = None
+
+    async def _heartbeat_loop(self, ws):
+        """Ping the connection every ping_interval, close it after repeated failures so recv() wakes up"""
+        try:
+            while self.running and self.ws is ws:
+                await asyncio.sleep(self.ping_interval)
+                if self.ws is not ws:
+                    return
+                if not await self.check_connection_health():
+                    logger.warning(
+                        "Connection health check failed, reconnecting...")
+                    self.heartbeat_stats['reconnects'] += 1
+                    try:
+                        await ws.close(code=1001)  # Going away
+                    except Exception:
+                        pass  # Ignore errors during close
+                    return
+        except asyncio.CancelledError:
+            pass
+
+    def get_heartbeat_stats(self) -> dict:
+        """Ping round-trip times and failure counts of the heartbeat task"""
+        rtts = list(self.heartbeat_rtts)
+        return {
+            **self.heartbeat_stats,
+            'consecutive_failures': self.heartbeat_failed_count,
+            'last_rtt': round(rtts[-1], 4) if rtts else None,
+            'avg_rtt': round(sum(rtts) / len(rtts), 4) if rtts else None,
+            'max_rtt': round(max(rtts), 4) if rtts else None,
+        }
+
     def should_log_error(self, error_msg: str) -> bool:
-        """Rate limit error logging"""
-        current_time = time.time()
-        if (current_time - self.last_error_time) >= self.error_log_interval:
-            self.last_error_time = current_time
-            return True
-        return False
+        """Rate limit error logging, per message"""
+        return self.log_limiter.allow(error_msg) is not None
 
-    async def listen(self, callback: Callable[[dict], None]):
-        """Listen for data from server"""
+    async def listen(self, callback: MessageCallback):
+        """Listen for data from server, callback can be a plain function or a coroutine function"""
         self.running = True
         self.server_check_count = 0
 
+        # skip the status check and /auth if a cached token is still valid
+        if not self.token and self.token_cache is not None:
+            self.token = self.token_cache.load(self.client_id)
+            if self.token:
+                logger.info("Using the cached access token")
+                print_status("Authentication", "Using the cached access token", "INFO")
+
+        if self.dispatcher is None:
+            self.dispatcher = SignalDispatcher(callback,
+                                               max_workers=self.dispatch_workers,
+                                               queue_size=self.dispatch_queue_size,
+                                               overflow_policy=self.overflow_policy)
+        self.dispatcher.start()
+
         while self.running:
             try:
                 # Check if authentication is needed
@@ -335,10 +926,10 @@ class DataClient:
                             self.running = False
                             return
 
-                        logger.error(f"Server is not available: {status_msg}")
-                        print_status("Server Check",
-                                     f"Server not available: {status_msg}",
-                                     "ERROR")
+                        if self.log_limiter.error(f"Server is not available: {status_msg}"):
+                            print_status("Server Check",
+                                         f"Server not available: {status_msg}",
+                                         "ERROR")
                         await asyncio.sleep(self.get_retry_delay())
                         continue
 
@@ -366,74 +957,219 @@ class DataClient:
                         continue
 
                 while self.running and self.ws:
-                    try:
-                        # Periodically check connection health
-                        if not await self.check_connection_health():
-                            logger.warning(
-                                "Connection health check failed, reconnecting...")
-                            try:
-                                await self.ws.close(code=1001)  # Going away
-                            except Exception:
-                                pass  # Ignore errors during close
-                            self.ws = None
-                            self.heartbeat_failed_count = 0  # Reset counter
-                            break
-
-                        try:
-                            message = await asyncio.wait_for(
-                                self.ws.recv(),
-                                timeout=self.ping_interval
-                            )
-
-                            # Reset heartbeat counter on successful message receipt
-                            self.heartbeat_failed_count = 0
-                            self.last_ping_time = time.time()
-
-                            data = json.loads(message)
-                            await self.handle_message(callback, data)
-
-                        except asyncio.TimeoutError:
-                            continue
-                        except json.JSONDecodeError:
-                            logger.error("Invalid message format")
-                            continue
-                        except Exception as e:
-                            if "ping timeout" in str(e).lower() or "keepalive" in str(e).lower():
-                                self.ws = None
-                                break
-                            logger.warning(f"Error processing message: {e}")
-                            continue
+                    # The heartbeat task checks liveness, the receive path only waits on recv(),
+                    # ConnectionClosed is handled below
+                    message = await self.ws.recv()
+                    received_at = time.time()
+
+                    # Reset heartbeat counter on successful message receipt
+                    self.heartbeat_failed_count = 0
+                    self.last_ping_time = time.time()
+                    self._log_recovery(self.recovery_timer.mark_message())
 
+                    try:
+                        # binary frames use the negotiated encoding, decoded straight from the received bytes
+                        if isinstance(message, bytes) and self.binary_codec is not None:
+                            self.handle_decoded(self.binary_codec.decode(message), received_at)
+                        else:
+                            self.handle_decoded(self.codec.decode(message), received_at)
+                    except json.JSONDecodeError:
+                        logger.error("Invalid message format")
                     except Exception as e:
-                        logger.error(f"Connection loop error: {str(e)}")
-                        self.ws = None
-                        break
+                        logger.warning(f"Error processing message: {e}")
+
+                    # block policy: stop reading while the dispatch queue is full
+                    await self.dispatcher.wait_for_space()
 
             except ConnectionClosed as e:
                 if not self.running:
                     return
-                if self.should_log_error(f"Connection closed ({e.code})"):
-                    logger.warning(f"Connection closed ({e.code}): {e.reason}")
+                self.log_limiter.warning(f"Connection closed ({e.code}): {e.reason}", key=f"closed:{e.code}")
+                self._drop_connection()
                 await self.handle_connection_closed(e)
 
             except Exception as e:
                 if not self.running:
                     return
-                if self.should_log_error(str(e)):
-                    logger.error(f"Unexpected error: {e}")
-                self.ws = None
-                await asyncio.sleep(self.get_retry_delay())
+                self.log_limiter.error(f"Unexpected error: {e}", key=f"unexpected:{type(e).__name__}")
+                self._drop_connection()
+                await self._backoff()
+
+    def _drop_connection(self):
+        """Forget the current WebSocket, stop its heartbeat and start the recovery timer"""
+        self._stop_heartbeat()
+        if self.ws is not None and len(self.endpoints) > 1:
+            self.failover_pending = True
+        self.ws = None
+        # the held signals stay held, the replay sent on reconnect brings the missing ones back with them
+        self.replay_pending = False
+        if self.replay_timer is not None:
+            self.replay_timer.cancel()
+            self.replay_timer = None
+        self.recovery_timer.mark_disconnected()
+
+    async def _backoff(self):
+        """Wait before the next retry, except right after a drop when other endpoints can take over"""
+        if self.failover_pending:
+            logger.info("Connection dropped, failing over to the other endpoints right away")
+            return
+        await asyncio.sleep(self.get_retry_delay())
+
+    def _log_recovery(self, record: Optional[dict]):
+        if record is None:
+            return
+        if record['disconnect_to_first_message'] is None:
+            logger.info(f"First message {record['reconnect_to_first_message']}s after connect")
+            return
+        logger.info(f"Recovered from disconnect: reconnect after {record['disconnect_to_reconnect']}s, "
+                    f"first message after {record['disconnect_to_first_message']}s")
+
+    def get_dispatch_stats(self) -> dict:
+        """Processed / dropped signals, queue depth per ticker and queue wait times"""
+        return self.dispatcher.get_stats() if self.dispatcher else {}
+
+    def get_recovery_stats(self) -> dict:
+        """Disconnect -> reconnect -> first message latency, for the recent reconnects"""
+        return self.recovery_timer.get_stats()
+
+    def handle_decoded(self, data: Any, received_at: Optional[float] = None):
+        """Convert a decoded message into a Signal and hand it to the dispatcher"""
+        if isinstance(data, dict) and data.get("type") == "replay":
+            self.handle_replay(data, received_at)
+            return
+        try:
+            signal = Signal.from_dict(data)
+        except ValueError as e:
+            logger.warning(f"Non-signal message ignored: {data}, {e}")
+            return
+        signal.trace = latency_tracker.start_trace(signal.timestamp, received_at)
+        latency_tracker.mark(signal.trace, 'decoded')
+        self.handle_message(signal)
+
+    def handle_message(self, signal: Signal):
+        """Hand incoming signals to the dispatcher, never waits on the callback"""
+        logger.debug(f"Received signal: {signal}")
+        if not signal.is_test and signal.seq is not None and self._hold_for_replay(signal):
+            return
+        self._dispatch(signal)
+
+    def _dispatch(self, signal: Signal):
+        if self.dedup_cache is not None and not signal.is_test and self.dedup_cache.seen(signal):
+            logger.info(f"Duplicate signal dropped: {signal}")
+            print_status("DataClient", f"Duplicate signal dropped: {signal}", "WARNING")
+            return
+        if not signal.is_test:
+            self._track_signal(signal)
+        self.dispatcher.submit(signal)
+
+    def _hold_for_replay(self, signal: Signal) -> bool:
+        """Hold a live signal while a replay is pending, or when it reveals a gap (then a replay is requested)"""
+        if self.replay_pending:
+            self.replay_buffer.append(signal)
+            return True
+        if (self.last_signal_seq is not None and signal.seq > self.last_signal_seq + 1
+                and self.replay_enabled and self.ws):
+            self.replay_stats['gaps'] += 1
+            logger.warning(f"Signal gap detected: {self.last_signal_seq} -> {signal.seq}, requesting replay")
+            # pending right away, so gaps seen before the request is sent don't send their own;
+            # the replay starts after the last signal before the gap, not the one that revealed it
+            self.replay_buffer.append(signal)
+            self.replay_pending = True
+            self.replay_task = asyncio.create_task(self.request_replay(since_seq=self.last_signal_seq))
+            return True
+        return False
 
-    async def handle_message(self, callback: Callable[[dict], None], data: dict):
-        """Handle incoming messages with error handling"""
+    def _track_signal(self, signal: Signal):
+        """Remember the last dispatched signal, and the recently dispatched seqs"""
+        if signal.seq is not None:
+            if signal.seq not in self.dispatched_seqs:
+                self.dispatched_seqs.add(signal.seq)
+                self._dispatched_order.append(signal.seq)
+                while len(self._dispatched_order) > self.replay_window:
+                    self.dispatched_seqs.discard(self._dispatched_order.popleft())
+            if self.last_signal_seq is None or signal.seq > self.last_signal_seq:
+                self.last_signal_seq = signal.seq
+        if signal.time is not None:
+            self.last_signal_time = signal.time
+
+    async def request_replay(self, since_seq: Optional[int] = None):
+        """Ask the server to re-send the signals after since_seq, by default after the last seen one"""
+        if since_seq is None:
+            since_seq = self.last_signal_seq
+        request = {"action": "replay", "since_seq": since_seq, "since_time": self.last_signal_time}
+        self.replay_pending = True
         try:
-            logger.debug(f"Processing received message: {data}")
-            callback(data)
-            logger.debug("Message processed successfully")
+            await self.ws.send(self.codec.encode(request))
+            self.replay_stats['requests'] += 1
+            logger.info(f"Replay requested since seq: {since_seq}, time: {self.last_signal_time}")
         except Exception as e:
-            logger.error(f"Error in message handler: {str(e)}")
-            print_status("Message Handler",
-                         f"Error processing message: {str(e)}", "ERROR")
+            logger.warning(f"Replay request failed: {e}")
+            self._end_replay()
+            return
+        # a lost or ignored answer must not hold the live signals, nor turn gap detection off, for good
+        if self.replay_timer is not None:
+            self.replay_timer.cancel()
+        self.replay_timer = asyncio.get_running_loop().call_later(self.replay_timeout, self._replay_timed_out)
+
+    def _replay_timed_out(self):
+        self.replay_timer = None
+        if not self.replay_pending:
+            return
+        self.replay_stats['timeouts'] += 1
+        logger.warning(f"No replay answer after {self.replay_timeout}s, "
+                       f"releasing {len(self.replay_buffer)} held signal(s)")
+        self._end_replay()
+
+    def handle_replay(self, data: dict, received_at: Optional[float] = None):
+        """Process replayed signals with the held live ones, in seq order, stale ones are dropped"""
+        signals = []
+        for item in data.get("signals") or []:
+            try:
+                signals.append(Signal.from_dict(item))
+            except ValueError as e:
+                logger.warning(f"Invalid replayed signal ignored: {item}, {e}")
+        self.replay_stats['received'] += len(signals)
+
+        now = time.time()
+        fresh = []
+        for signal in signals:
+            if signal.timestamp is not None and now - signal.timestamp > self.replay_max_age:
+                self.replay_stats['stale'] += 1
+                logger.warning(f"Stale replayed signal dropped: {signal}")
+                continue
+            # the server time of a replayed signal is not a delivery latency, only the local stages are traced
+            signal.trace = latency_tracker.start_trace(received_at=received_at)
+            latency_tracker.mark(signal.trace, 'decoded')
+            fresh.append(signal)
+        self._end_replay(fresh)
+        logger.info(f"Replay received: {len(signals)} signal(s), stats: {self.replay_stats}")
+
+    def _end_replay(self, replayed: List[Signal] = ()):
+        """Dispatch the replayed and the held signals in seq order, seqs already dispatched are skipped"""
+        self.replay_pending = False
+        if self.replay_timer is not None:
+            self.replay_timer.cancel()
+            self.replay_timer = None
+        by_seq = {}
+        unsequenced = []
+        # the held live copy wins over its replayed one, its trace has the server stamp
+        for signal in [*replayed, *self.replay_buffer]:
+            if signal.seq is None:
+                unsequenced.append(signal)
+            else:
+                by_seq[signal.seq] = signal
+        self.replay_buffer = []
+
+        for seq in sorted(by_seq):
+            if seq in self.dispatched_seqs:
+                self.replay_stats['duplicates'] += 1
+                logger.info(f"Replayed signal already dispatched, dropped: {by_seq[seq]}")
+                continue
+            self.replay_stats['processed'] += 1
+            self._dispatch(by_seq[seq])
+        for signal in sorted(unsequenced, key=lambda sig: sig.timestamp or 0.0):
+            self.replay_stats['processed'] += 1
+            self._dispatch(signal)
 
     async def handle_connection_closed(self, e: ConnectionClosed):
         """Handle different connection closed scenarios"""
@@ -442,15 +1178,15 @@ class DataClient:
             print_status("Connection",
                          "Server is restarting, will attempt to reconnect...",
                          "WARNING")
-            # Reset counters for clean reconnection
+            # Reset counters for clean reconnection, no fixed wait: connect() races the endpoints right away,
+            # and backs off if none is back yet
             self.heartbeat_failed_count = 0
             self.retry_count = 0
-            await asyncio.sleep(5)  # Give server time to restart
             return
 
         elif e.code == 4000:  # Private use (usually auth issues)
             logger.warning("Server indicated authentication issue")
-            self.token = None
+            self._clear_token()
             self.auth_required = True
             self.retry_count = 0  # Reset retry count for re-auth
             return
@@ -460,11 +1196,10 @@ class DataClient:
             self.retry_count += 1
 
         elif e.code == 1011:  # Internal error (usually ping timeout)
-            logger.warning(
-                "Connection ping timeout, will attempt to reconnect")
+            self.log_limiter.warning("Connection ping timeout, will attempt to reconnect")
             self.retry_count += 1
-            self.ws = None
-            await asyncio.sleep(self.get_retry_delay())
+            self._drop_connection()
+            await self._backoff()
             return
 
         elif e.code == 1000:  # Normal closure
@@ -472,18 +1207,19 @@ class DataClient:
 
         elif e.code == 4001:  # Authentication error
             logger.error("Authentication failed, clearing token")
-            self.token = None
+            self._clear_token()
 
         else:
-            logger.warning(f"Connection closed with code {e.code}")
+            self.log_limiter.warning(f"Connection closed with code {e.code}")
 
-        await asyncio.sleep(self.get_retry_delay())
+        await self._backoff()
 
     async def close(self):
         """Gracefully close the connection"""
         logger.info("Initiating graceful shutdown")
         print_status("Shutdown", "Initiating graceful shutdown", "INFO")
         self.running = False
+        self._stop_heartbeat()
 
         if self.ws:
             try:
@@ -496,6 +1232,17 @@ class DataClient:
                 print_status(
                     "Shutdown", f"Error closing connection: {str(e)}", "ERROR")
 
+        if self.dispatcher:
+            await self.dispatcher.stop()
+
+        await self.close_http_session()
+        if self.dedup_cache is not None:
+            self.dedup_cache.save()
+            logger.info(f"Signal dedup cache stats: {self.dedup_cache.get_stats()}")
+        logger.info(f"Connection recovery stats: {self.get_recovery_stats()}")
+        logger.info(f"Heartbeat stats: {self.get_heartbeat_stats()}")
+        self.log_limiter.flush()
+
         logger.info("Shutdown complete")
         print_status("Shutdown", "Complete", "SUCCESS")
 